@@ -3,7 +3,6 @@ from starlette.exceptions import HTTPException as StarletteHTTPException
 from fastapi.staticfiles import StaticFiles
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.sessions import SessionMiddleware
 from routes import blog, auth
 from utils.common import lifespan
 from utils import exc_handler, middleware
@@ -24,7 +23,7 @@ app.add_middleware(CORSMiddleware,
 load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 # signed cookie 적용. 
-app.add_middleware(SessionMiddleware, secret_key=SECRET_KEY, max_age=3600)
+app.add_middleware(middleware.SignedCookieSessionMiddleware, secret_key=SECRET_KEY, max_age=3600, renew_after=300)
 
 app.add_middleware(middleware.MethodOverrideMiddlware)
 
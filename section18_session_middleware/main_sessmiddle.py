@@ -1,5 +1,5 @@
 from fastapi import FastAPI, Request, Depends, HTTPException, Form, status
-from starlette.middleware.sessions import SessionMiddleware
+from utils.middleware import SignedCookieSessionMiddleware
 from fastapi.responses import HTMLResponse, RedirectResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
@@ -12,7 +12,8 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 
 # SessionMiddleware 등록
-app.add_middleware(SessionMiddleware, secret_key=SECRET_KEY, max_age=3600)
+# 변경되었거나 renew_after가 지난 경우에만 다시 sign 하는 SessionMiddleware 
+app.add_middleware(SignedCookieSessionMiddleware, secret_key=SECRET_KEY, max_age=3600, renew_after=300)
 #max_age=None하면 다시 접속시 사라짐. 아예 안쓰면 max_age가 2주.
 
 # 테스트용 User를 Dict로 생성. 
@@ -1,5 +1,14 @@
 from fastapi import Request
 from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from itsdangerous.exc import BadSignature
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+import itsdangerous
+import json
+import time
 
 class DummyMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
@@ -25,5 +34,97 @@ class MethodOverrideMiddlware(BaseHTTPMiddleware):
         response = await call_next(request)
         return response
 
+class SignedCookieSessionMiddleware:
+    """
+    starlette SessionMiddleware와 같은 사용법/cookie 형식(base64 json + itsdangerous TimestampSigner). 
+    - session 값이 바뀌었거나 renew_after 초가 지난 경우에만 다시 sign해서 Set-Cookie를 보냄. 
+      (SessionMiddleware는 session이 있으면 매 응답마다 다시 sign함)
+    - 최근에 확인한 cookie는 검증 결과를 LRU로 보관하여 HMAC 계산 생략. max_age는 timestamp로 계속 확인.
+    """
+    def __init__(self, app: ASGIApp, secret_key: str, session_cookie: str = "session",
+                 max_age: int = 14 * 24 * 60 * 60, path: str = "/", 
+                 same_site: str = "lax", https_only: bool = False, domain: str = None,
+                 renew_after: int = None, verify_cache_size: int = 1024):
+        self.app = app
+        self.signer = itsdangerous.TimestampSigner(str(secret_key))
+        self.session_cookie = session_cookie
+        self.max_age = max_age
+        self.path = path
+        self.security_flags = "httponly; samesite=" + same_site
+        if https_only:
+            self.security_flags += "; secure"
+        if domain is not None:
+            self.security_flags += f"; domain={domain}"
+        # max_age가 없으면(브라우저 session cookie) 갱신할 필요 없음. 
+        if renew_after is None and max_age is not None:
+            renew_after = max_age // 10
+        self.renew_after = renew_after
+        self.verify_cache_size = verify_cache_size
+        # cookie 값 -> (json payload, sign된 시각)
+        self.verify_cache = OrderedDict()
 
-        
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        cookie_value = HTTPConnection(scope).cookies.get(self.session_cookie)
+        payload, signed_at = self.verify(cookie_value) if cookie_value else (None, None)
+        scope["session"] = json.loads(payload) if payload else {}
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                session = scope["session"]
+                if session:
+                    new_payload = json.dumps(session)
+                    if new_payload != payload or self.needs_renewal(signed_at):
+                        headers.append("set-cookie", self.cookie_header(self.sign(new_payload)))
+                elif payload:
+                    # session을 clear 함. 
+                    headers.append("set-cookie", self.cookie_header("null", expire=True))
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    def verify(self, cookie_value: str) -> tuple:
+        cached = self.verify_cache.get(cookie_value)
+        if cached is not None:
+            payload, signed_at = cached
+            if self.max_age is None or time.time() - signed_at <= self.max_age:
+                self.verify_cache.move_to_end(cookie_value)
+                return cached
+            del self.verify_cache[cookie_value]
+            return None, None
+
+        try:
+            data, signed_at = self.signer.unsign(cookie_value.encode("utf-8"), max_age=self.max_age,
+                                                 return_timestamp=True)
+            result = (b64decode(data).decode("utf-8"), signed_at.timestamp())
+        except (BadSignature, ValueError):
+            return None, None
+
+        self.verify_cache[cookie_value] = result
+        if len(self.verify_cache) > self.verify_cache_size:
+            self.verify_cache.popitem(last=False)
+        return result
+
+    def sign(self, payload: str) -> str:
+        cookie_value = self.signer.sign(b64encode(payload.encode("utf-8"))).decode("utf-8")
+        # 다음 요청에서 바로 사용될 cookie이므로 미리 검증 결과를 넣어둠.
+        self.verify_cache[cookie_value] = (payload, time.time())
+        if len(self.verify_cache) > self.verify_cache_size:
+            self.verify_cache.popitem(last=False)
+        return cookie_value
+
+    def needs_renewal(self, signed_at: float) -> bool:
+        if self.renew_after is None or signed_at is None:
+            return False
+        return time.time() - signed_at >= self.renew_after
+
+    def cookie_header(self, value: str, expire: bool = False) -> str:
+        if expire:
+            expires = "expires=Thu, 01 Jan 1970 00:00:00 GMT; "
+        else:
+            expires = f"Max-Age={self.max_age}; " if self.max_age is not None else ""
+        return f"{self.session_cookie}={value}; path={self.path}; {expires}{self.security_flags}"
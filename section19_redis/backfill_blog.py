@@ -0,0 +1,47 @@
+import asyncio
+from sqlalchemy import text
+from db.database import engine
+from utils import util
+
+# 저장 시점에 계산하는 blog 컬럼(summary, content_html)이 비어있는 기존 데이터를 채워주는 스크립트. 
+# section19_redis 디렉토리에서 python backfill_blog.py 로 수행. 
+BATCH_SIZE = 500
+
+async def backfill_blogs():
+    last_id = 0
+    total = 0
+    async with engine.connect() as conn:
+        while True:
+            # id 순서로 BATCH_SIZE 건씩 끊어서 처리. 
+            query = """
+            SELECT id, content from blog
+            where id > :last_id and (summary is null or content_html is null)
+            order by id
+            limit :limit
+            """
+            result = await conn.execute(text(query).bindparams(last_id=last_id, limit=BATCH_SIZE))
+            rows = result.fetchall()
+            result.close()
+            if not rows:
+                break
+
+            update_query = """
+            UPDATE blog SET summary = :summary, content_html = :content_html
+            where id = :id
+            """
+            await conn.execute(text(update_query),
+                               [{"id": row.id, 
+                                 "summary": util.truncate_text(row.content),
+                                 "content_html": util.content_to_html(row.content)}
+                                for row in rows])
+            await conn.commit()
+
+            last_id = rows[-1].id
+            total += len(rows)
+            print(f"backfilled {total} blogs (last id: {last_id})")
+
+    await engine.dispose()
+    print("backfill done:", total)
+
+if __name__ == "__main__":
+    asyncio.run(backfill_blogs())
@@ -0,0 +1,90 @@
+import asyncio
+import time
+from fastapi import FastAPI, Depends, Request
+from fastapi.templating import Jinja2Templates
+from db.database import (conn_scope, context_get_conn, read_conn_scope, 
+                         pool_metrics, read_pool_metrics, engine, read_engine)
+from services import blog_svc
+
+# db.database의 conn_scope/context_get_conn과 blog_svc.get_all_blogs, templates/index.html을 그대로 사용해서 
+# 요청당 DB connection 점유 시간을 비교하고, scoped가 더 짧은지 확인(assert). 
+# - depends: conn = Depends(context_get_conn). rendering/응답 전송이 끝날 때까지 connection 점유(변경 전)
+# - scoped: async with conn_scope(request): 조회가 끝나면 바로 반납(변경 후, routes/blog.py 방식)
+# - read_scoped: async with read_conn_scope(request): routes/blog.py와 동일한 read_engine 사용
+# 점유 시간은 pool_metrics/read_pool_metrics의 route별 hold 통계(db_route_hold_* metric과 동일)를 사용. 
+# 느린 client(응답 body 수신에 SLOW_CLIENT_DELAY초)가 CONCURRENCY개 동시에 요청. 
+# .env의 DATABASE_CONN(MySQL, blog 데이터 입력 완료)을 사용. section19_redis 디렉토리에서 수행.
+CONCURRENCY = 20
+REQUESTS = 200
+SLOW_CLIENT_DELAY = 0.02
+
+templates = Jinja2Templates(directory="templates")
+app = FastAPI()
+
+@app.get("/depends")
+async def depends_route(request: Request, conn = Depends(context_get_conn)):
+    page = await blog_svc.get_all_blogs(conn)
+    return templates.TemplateResponse(request=request, name="index.html",
+                                      context={"page": page, "session_user": None})
+
+@app.get("/scoped")
+async def scoped_route(request: Request):
+    async with conn_scope(request) as conn:
+        page = await blog_svc.get_all_blogs(conn)
+    return templates.TemplateResponse(request=request, name="index.html",
+                                      context={"page": page, "session_user": None})
+
+@app.get("/read_scoped")
+async def read_scoped_route(request: Request):
+    async with read_conn_scope(request) as conn:
+        page = await blog_svc.get_all_blogs(conn)
+    return templates.TemplateResponse(request=request, name="index.html",
+                                      context={"page": page, "session_user": None})
+
+async def request(path: str):
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+             "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+             "query_string": b"", "root_path": "", "headers": [(b"host", b"localhost")],
+             "client": ("127.0.0.1", 50000), "server": ("localhost", 8000)}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        # 느린 client: body를 받는데 시간이 걸림. 
+        if message["type"] == "http.response.body":
+            await asyncio.sleep(SLOW_CLIENT_DELAY)
+
+    await app(scope, receive, send)
+
+async def run(path: str, metrics) -> dict:
+    queue = asyncio.Queue()
+    for _ in range(REQUESTS):
+        queue.put_nowait(path)
+
+    async def worker():
+        while not queue.empty():
+            await request(queue.get_nowait())
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+    elapsed = time.perf_counter() - start
+    hold = metrics.route_hold[path]
+    avg_hold = hold["seconds_total"] / hold["count"]
+    print(f"{path:12s} {REQUESTS} requests {elapsed:.3f}s  "
+          f"hold avg {avg_hold * 1000:.2f}ms max {hold['seconds_max'] * 1000:.2f}ms  "
+          f"{REQUESTS / elapsed:.0f} req/s")
+    return {"elapsed": elapsed, "avg_hold": avg_hold}
+
+async def main():
+    depends = await run("/depends", pool_metrics)
+    scoped = await run("/scoped", pool_metrics)
+    read_scoped = await run("/read_scoped", read_pool_metrics)
+    await engine.dispose()
+    await read_engine.dispose()
+    assert scoped["avg_hold"] < depends["avg_hold"], "conn_scope should release the connection before rendering"
+    assert read_scoped["avg_hold"] < depends["avg_hold"], "read_conn_scope should release the connection before rendering"
+    print("ok: scoped hold time is lower than depends")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+import asyncio
+import time
+from starlette.applications import Starlette
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from utils import middleware
+from utils.session import LazySession
+
+# BaseHTTPMiddleware 기반(변경 전)과 순수 ASGI 기반(변경 후) middleware의 요청당 overhead 비교. 
+# Redis를 사용하지 않도록 session cookie 없는 요청으로 측정. 
+# section19_redis 디렉토리에서 python bench_middleware.py 로 수행.
+N_REQUESTS = 20000
+
+class LegacyMethodOverrideMiddlware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        if request.method == "POST":
+            query = request.query_params
+            if query:
+                method_override = query.get("_method")
+                if method_override and method_override.upper() in ("PUT", "DELETE"):
+                    request.scope["method"] = method_override.upper()
+        return await call_next(request)
+
+class LegacySessionMiddleware(BaseHTTPMiddleware):
+    # session 처리 로직은 동일하므로, BaseHTTPMiddleware 구조 자체의 비용만 측정.
+    async def dispatch(self, request: Request, call_next):
+        request.state.session = LazySession(None)
+        return await call_next(request)
+
+async def homepage(request: Request):
+    return PlainTextResponse("ok")
+
+def build_app(method_override_cls, session_cls):
+    app = Starlette(routes=[Route("/blogs/", homepage)])
+    app.add_middleware(method_override_cls)
+    app.add_middleware(session_cls)
+    return app
+
+async def run_requests(app, n: int) -> float:
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+             "method": "GET", "scheme": "http", "path": "/blogs/", "raw_path": b"/blogs/",
+             "query_string": b"", "root_path": "", "headers": [(b"host", b"localhost")],
+             "client": ("127.0.0.1", 50000), "server": ("localhost", 8000)}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for _ in range(n):
+        await app(dict(scope, state={}), receive, send)
+    return time.perf_counter() - start
+
+async def main():
+    apps = {
+        "BaseHTTPMiddleware": build_app(LegacyMethodOverrideMiddlware, LegacySessionMiddleware),
+        "pure ASGI": build_app(middleware.MethodOverrideMiddlware, middleware.RedisSessionMiddleware),
+        "no middleware": Starlette(routes=[Route("/blogs/", homepage)]),
+    }
+    # warm up
+    for app in apps.values():
+        await run_requests(app, 1000)
+
+    for name, app in apps.items():
+        elapsed = await run_requests(app, N_REQUESTS)
+        print(f"{name:>20}: {elapsed / N_REQUESTS * 1_000_000:8.1f} us/request")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+import asyncio
+import time
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from starlette.requests import Request
+from db.database import DATABASE_CONN, conn_scope, engine, read_engine
+from services import blog_svc, auth_svc
+
+# db.database의 engine(transactional)과 read_engine(AUTOCOMMIT, pool_reset_on_return=None)으로 
+# 조회 요청당 DB round trip 수와 latency를 비교. round trip은 MySQL 서버의 GLOBAL STATUS 
+# (Questions: 서버가 받은 statement 수, Com_select, Com_rollback, Com_commit)의 증가분으로 계산하므로 
+# 다른 client가 같은 MySQL 서버를 사용하지 않는 상태에서 수행. 
+# 요청 하나 = conn_scope(request, read_only=...) -> blog 1건 조회(select_blog_by_id, 캐시 미사용)와 
+# 사용자 조회(get_user_by_email) -> 반납. routes/blog.py, routes/auth.py의 조회와 동일. 
+# .env의 DATABASE_CONN(MySQL, initial_blog_user.sql 데이터 입력 완료)을 사용. section19_redis 디렉토리에서 수행. 
+REQUESTS = 2000
+BLOG_IDS = (1, 2, 3)
+EMAIL = "dooley@gmail.com"
+
+STATUS_NAMES = ("Questions", "Com_select", "Com_rollback", "Com_commit")
+
+async def server_status(status_conn) -> dict:
+    result = await status_conn.execute(text(
+        "SHOW GLOBAL STATUS WHERE Variable_name IN ('Questions', 'Com_select', 'Com_rollback', 'Com_commit')"))
+    return {name: int(value) for name, value in result}
+
+def make_request(path: str) -> Request:
+    return Request({"type": "http", "method": "GET", "path": path, "raw_path": path.encode(),
+                    "query_string": b"", "root_path": "", "headers": [], "scheme": "http",
+                    "server": ("localhost", 8000)})
+
+async def handle(request: Request, read_only: bool, i: int):
+    async with conn_scope(request, read_only=read_only) as conn:
+        await blog_svc.select_blog_by_id(conn, BLOG_IDS[i % len(BLOG_IDS)])
+        await auth_svc.get_user_by_email(conn, EMAIL)
+
+async def run(name: str, read_only: bool, status_conn):
+    request = make_request(f"/bench/{name}")
+    # pool에 connection을 미리 만들어 두어 connect 비용은 제외. 
+    await handle(request, read_only, 0)
+    before = await server_status(status_conn)
+
+    latencies = []
+    for i in range(REQUESTS):
+        start = time.perf_counter()
+        await handle(request, read_only, i)
+        latencies.append(time.perf_counter() - start)
+
+    after = await server_status(status_conn)
+    # after를 조회한 SHOW 문 자신도 Questions에 포함되므로 제외. 
+    after["Questions"] -= 1
+    per_request = {key: (after[key] - before[key]) / REQUESTS for key in STATUS_NAMES}
+
+    latencies.sort()
+    print(f"{name:14s} round trips/request {per_request['Questions']:.2f} "
+          f"(select {per_request['Com_select']:.2f}, rollback {per_request['Com_rollback']:.2f}, "
+          f"commit {per_request['Com_commit']:.2f})  "
+          f"avg {sum(latencies) / REQUESTS * 1000:.3f}ms "
+          f"p99 {latencies[int(REQUESTS * 0.99)] * 1000:.3f}ms")
+    return per_request
+
+async def main():
+    # 서버 상태 조회용 connection. 측정 대상 pool과 섞이지 않도록 별도 engine으로 한 번만 연결. 
+    status_engine = create_async_engine(DATABASE_CONN, poolclass=NullPool, isolation_level="AUTOCOMMIT")
+    async with status_engine.connect() as status_conn:
+        transactional = await run("transactional", False, status_conn)
+        autocommit = await run("autocommit", True, status_conn)
+    await status_engine.dispose()
+    await engine.dispose()
+    await read_engine.dispose()
+    assert autocommit["Com_rollback"] < transactional["Com_rollback"], \
+        "read_engine should not send ROLLBACK when the connection is returned"
+    assert autocommit["Questions"] < transactional["Questions"], \
+        "read_engine should need fewer round trips per request"
+
+if __name__ == "__main__":
+    asyncio.run(main())
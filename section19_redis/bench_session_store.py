@@ -0,0 +1,92 @@
+import asyncio
+import os
+import time
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, RedirectResponse
+from starlette.routing import Route
+from utils.middleware import RedisSessionMiddleware
+from utils.session_store import MemorySessionStore, RedisSessionStore, SQLSessionStore
+
+# /auth/login -> /blogs 흐름에서 session 저장소별 요청당 비용 비교. 
+# 로그인 1회 후 /blogs를 PAGE_VIEWS번 조회하는 사용자를 N_USERS명 수행. 
+# DB/template 비용을 빼고 session 처리 비용만 보기 위해 route는 session만 사용. 
+# section19_redis 디렉토리에서 python bench_session_store.py 로 수행.
+# sql 저장소는 BENCH_SQL_CONN(예: sqlite+aiosqlite:///bench.db) 또는 DATABASE_CONN을 사용. 
+N_USERS = 500
+PAGE_VIEWS = 10
+
+async def login(request: Request):
+    session = await request.state.session.load()
+    session["session_user"] = {"id": 1, "name": "둘리", "email": "dooley@gmail.com"}
+    return RedirectResponse("/blogs/", status_code=302)
+
+async def get_all_blogs(request: Request):
+    session = await request.state.session.load()
+    return PlainTextResponse(session["session_user"]["name"])
+
+def build_app(store):
+    app = Starlette(routes=[Route("/auth/login", login, methods=["POST"]),
+                            Route("/blogs/", get_all_blogs)])
+    app.add_middleware(RedisSessionMiddleware, store=store)
+    return app
+
+async def request(app, method: str, path: str, cookie: str = None) -> str:
+    headers = [(b"host", b"localhost")]
+    if cookie:
+        headers.append((b"cookie", cookie.encode("latin-1")))
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+             "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+             "query_string": b"", "root_path": "", "headers": headers, "state": {},
+             "client": ("127.0.0.1", 50000), "server": ("localhost", 8000)}
+    set_cookie = None
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal set_cookie
+        if message["type"] == "http.response.start":
+            for key, value in message["headers"]:
+                if key == b"set-cookie":
+                    set_cookie = value.decode("latin-1").split(";")[0]
+
+    await app(scope, receive, send)
+    return set_cookie or cookie
+
+async def run_flow(app) -> float:
+    start = time.perf_counter()
+    for _ in range(N_USERS):
+        cookie = await request(app, "POST", "/auth/login")
+        for _ in range(PAGE_VIEWS):
+            cookie = await request(app, "GET", "/blogs/", cookie)
+    return time.perf_counter() - start
+
+async def main():
+    stores = {"memory": MemorySessionStore()}
+    try:
+        from db.redis_db import async_redis_client
+        await async_redis_client.ping()
+        stores["redis"] = RedisSessionStore(async_redis_client, key_prefix="bench:")
+    except Exception as e:
+        print("skip redis store:", e)
+
+    sql_conn = os.getenv("BENCH_SQL_CONN") or os.getenv("DATABASE_CONN")
+    if sql_conn:
+        from sqlalchemy import text
+        from sqlalchemy.ext.asyncio import create_async_engine
+        engine = create_async_engine(sql_conn)
+        async with engine.begin() as conn:
+            await conn.execute(text("""
+            create table if not exists session
+            (id varchar(64) primary key, data blob not null, expires_at bigint not null)
+            """))
+        stores["sql"] = SQLSessionStore(engine)
+
+    n_requests = N_USERS * (PAGE_VIEWS + 1)
+    for name, store in stores.items():
+        elapsed = await run_flow(build_app(store))
+        print(f"{name:>8}: {elapsed / n_requests * 1000:8.3f} ms/request ({n_requests} requests)")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,40 @@
+import asyncio
+from utils.session_store import HashRing, ShardedRedisSessionStore
+import uuid
+
+# consistent hash ring의 분산과 node 추가 시 이동하는 key 비율 확인.
+# fakeredis가 설치되어 있으면 ShardedRedisSessionStore도 여러 node로 수행해 봄. 
+# section19_redis 디렉토리에서 python check_hash_ring.py 로 수행.
+N_KEYS = 100000
+
+def check_ring():
+    keys = [str(uuid.uuid4()) for _ in range(N_KEYS)]
+    nodes = [f"redis://node{i}:6379/0" for i in range(4)]
+    ring = HashRing(nodes)
+    before = {key: ring.get_node(key) for key in keys}
+
+    counts = {node: 0 for node in nodes}
+    for node in before.values():
+        counts[node] += 1
+    print("distribution with 4 nodes:", {node: f"{count / N_KEYS:.1%}" for node, count in counts.items()})
+
+    ring.add_node("redis://node4:6379/0")
+    moved = sum(1 for key in keys if ring.get_node(key) != before[key])
+    print(f"moved after adding 5th node: {moved / N_KEYS:.1%} (ideal {1 / 5:.1%})")
+
+async def check_sharded_store():
+    try:
+        import fakeredis
+    except ImportError:
+        print("skip sharded store check: fakeredis is not installed")
+        return
+    clients = {f"node{i}": fakeredis.FakeAsyncRedis() for i in range(3)}
+    store = ShardedRedisSessionStore(clients)
+    for _ in range(1000):
+        await store.set(str(uuid.uuid4()), b"session", 3600)
+    print("key counts:", await store.key_counts())
+    print("stats:", store.get_stats())
+
+if __name__ == "__main__":
+    check_ring()
+    asyncio.run(check_sharded_store())
@@ -0,0 +1,81 @@
+import redis.asyncio as aioredis
+from redis.exceptions import ConnectionError as RedisConnectionError
+from dotenv import load_dotenv
+import os
+import time
+
+load_dotenv()
+
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+# pool의 최대 connection 수와, connection이 모두 사용 중일 때 반납을 기다리는 최대 시간(초)
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "2"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "1"))
+# pub/sub listener connection이 살아 있는지 PING으로 확인하는 간격(초)
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+
+class InstrumentedBlockingConnectionPool(aioredis.BlockingConnectionPool):
+    """
+    connection이 모두 사용 중이면 오류 대신 timeout까지 대기(queue)하는 pool. 
+    connection 획득 대기 시간과 timeout 건수를 기록. 
+    """
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.acquire_count = 0
+        self.acquire_timeouts = 0
+        self.acquire_wait_total = 0.0
+        self.acquire_wait_max = 0.0
+
+    # pool이 빈 connection을 timeout까지 기다리지 못했을 때 BlockingConnectionPool이 내는 오류 메시지
+    POOL_TIMEOUT_MESSAGE = "No connection available."
+
+    async def get_connection(self, command_name, *keys, **options):
+        start = time.perf_counter()
+        try:
+            connection = await super().get_connection(command_name, *keys, **options)
+        except RedisConnectionError as e:
+            # connection refused 등 connect() 단계의 오류는 pool 대기 timeout이 아니므로 제외. 
+            if str(e) == self.POOL_TIMEOUT_MESSAGE:
+                self.acquire_timeouts += 1
+            raise
+        # 획득 건수와 대기 시간은 성공한 획득만 집계. 
+        wait = time.perf_counter() - start
+        self.acquire_count += 1
+        self.acquire_wait_total += wait
+        self.acquire_wait_max = max(self.acquire_wait_max, wait)
+        return connection
+
+    def get_stats(self) -> dict:
+        return {
+            "max_connections": self.max_connections,
+            "in_use": len(self._in_use_connections),
+            "idle": len(self._available_connections),
+            "acquire_count": self.acquire_count,
+            "acquire_timeouts": self.acquire_timeouts,
+            "acquire_wait_seconds_total": self.acquire_wait_total,
+            "acquire_wait_seconds_max": self.acquire_wait_max,
+        }
+
+# asyncio 기반 Redis client. await로 호출하므로 event loop를 block 하지 않음. 
+async_redis_pool = InstrumentedBlockingConnectionPool(host=REDIS_HOST, port=REDIS_PORT, db=0, 
+                                                      max_connections=REDIS_MAX_CONNECTIONS,
+                                                      timeout=REDIS_POOL_TIMEOUT,
+                                                      socket_timeout=REDIS_SOCKET_TIMEOUT,
+                                                      socket_connect_timeout=REDIS_SOCKET_TIMEOUT)
+async_redis_client = aioredis.Redis(connection_pool=async_redis_pool)
+
+# pub/sub listener 전용 client. 구독 connection은 메시지가 없어도 계속 대기해야 하므로 
+# socket_timeout 없이 별도 pool을 사용하고, 끊긴 connection은 health check(PING)로 감지. 
+async_redis_pubsub_client = aioredis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0,
+                                           socket_timeout=None,
+                                           socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+                                           health_check_interval=REDIS_HEALTH_CHECK_INTERVAL)
+
+def create_redis_client(url: str) -> aioredis.Redis:
+    # url(redis://host:port/db)로 기본 client와 같은 설정의 pool을 가진 client 생성. 
+    pool = InstrumentedBlockingConnectionPool.from_url(url, max_connections=REDIS_MAX_CONNECTIONS,
+                                                       timeout=REDIS_POOL_TIMEOUT,
+                                                       socket_timeout=REDIS_SOCKET_TIMEOUT,
+                                                       socket_connect_timeout=REDIS_SOCKET_TIMEOUT)
+    return aioredis.Redis(connection_pool=pool)
@@ -28,11 +28,15 @@ create table blog_db.blog
 title varchar(200) not null,
 author_id int not null,
 content varchar(4000) not null,
+summary varchar(200) null,
+content_html text null,
 image_loc varchar(300) null,
 modified_dt datetime not null
 );
 
 create index author_id_idx on blog(author_id);
+-- /blogs 목록의 keyset pagination용 (modified_dt, id) 복합 인덱스
+create index modified_dt_id_idx on blog(modified_dt, id);
 
 insert into blog(title, author_id, content, modified_dt)
 values ('FastAPI는 어떤 장점이 있는가?', 1, 
@@ -62,6 +66,33 @@ FastAPI는 다양한 규모와 유형의 프로젝트에서 성능과 개발 효
 
 COMMIT;
 
+/* 초기 데이터 입력 후 python backfill_blog.py 를 수행하여 summary, content_html을 채워줌. 
+   기존 blog 테이블이라면 아래 컬럼 추가 후 수행. 
+alter table blog add column summary varchar(200) null after content;
+alter table blog add column content_html text null after summary;
+*/
+
+/* SESSION_STORE=sql 일때 사용하는 session 테이블. expires_at은 epoch 초 */
+drop table if exists session;
+
+create table session
+(
+    id varchar(64) primary key,
+    data blob not null,
+    expires_at bigint not null
+);
+
+create index expires_at_idx on session(expires_at);
+
+/* 사용자별 session 목록. 사용자의 모든 session을 만료(로그아웃)할 때 사용 */
+drop table if exists user_session;
+
+create table user_session
+(
+    user_id integer not null,
+    session_id varchar(64) not null,
+    primary key (user_id, session_id)
+);
 
 /* connection 모니터링 스크립트. root로 수행 필요. */
 select * from sys.session where db='blog_db' order by conn_id;
\ No newline at end of file
@@ -4,7 +4,8 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
-from routes import blog, auth
+from routes import blog, auth, metrics
+from services import blog_svc, auth_svc
 from utils.common import lifespan
 from utils import exc_handler, middleware
 from dotenv import load_dotenv
@@ -27,10 +28,19 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 # app.add_middleware(SessionMiddleware, secret_key=SECRET_KEY, max_age=3600)
 
 app.add_middleware(middleware.MethodOverrideMiddlware)
-app.add_middleware(middleware.RedisSessionMiddleware)
+# session 저장소는 SESSION_STORE 환경변수(redis, memory, sql)로 선택. 기본은 redis
+# static 파일 요청은 session 처리 대상에서 제외
+session_store = auth_svc.session_store
+# 로그인 사용자 정보(id, name, email)는 signed cookie로 주고받아 Redis 조회 없이 사용(hybrid session). 
+app.add_middleware(middleware.RedisSessionMiddleware, exclude_paths=("/static",), 
+                   store=session_store, identity_cookie="session_identity", secret_key=SECRET_KEY)
+# 익명 사용자 페이지 캐시는 session 처리 이전(가장 바깥쪽)에서 수행되어야 함. 
+app.add_middleware(middleware.PageCacheMiddleware, page_cache=blog_svc.page_cache,
+                   identity_cookie="session_identity")
 
 app.include_router(blog.router)
 app.include_router(auth.router)
+app.include_router(metrics.router)
 
 app.add_exception_handler(StarletteHTTPException, exc_handler.custom_http_exception_handler)
 app.add_exception_handler(RequestValidationError, exc_handler.validation_exception_handler)
\ No newline at end of file
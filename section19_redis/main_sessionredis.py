@@ -19,16 +19,18 @@ users_db = {
     }
 }
 
-def get_session(request: Request):
-    print("request.session:", request.state.session)
-    return request.session
+async def get_session(request: Request):
+    session = await request.state.session.load()
+    print("request.session:", session)
+    return session
 
-def get_session_user(request: Request):
+async def get_session_user(request: Request):
     if not request.state._state: #_state는 add_middleware를 안했으면 None이 나옴.
         print("#### Redis Sesssion has not been set")
         return None
     
-    session = request.state.session
+    # request.state.session은 처음 사용할 때 load() 해야 Redis에서 값을 가져옴.
+    session = await request.state.session.load()
     if "session_user" not in session.keys():
         return None
     else:
@@ -63,7 +65,7 @@ async def login(request: Request, email: str = Form(...), password: str = Form(.
 
     # FastAPI의 request.state.session에 값 할당.  
     # session = request.state.session이 여기서 중요!!! (request.state.session은 middleware에 정의되어있음. 활용하는 거는 여기서.)
-    session = request.state.session
+    session = await request.state.session.load()
     print("##### session:", session)
     # dictionary 값으로 넣는 것은 같음.
     session["session_user"] = {"username": user_data["username"], "email": user_data["email"]}
@@ -73,8 +75,7 @@ async def login(request: Request, email: str = Form(...), password: str = Form(.
 
 @app.get("/logout")
 async def logout(request: Request):
-    if request.state.session:
-        request.state.session.clear()
+    request.state.session.clear()
         
     return RedirectResponse(url="/", status_code=status.HTTP_303_SEE_OTHER)
 
@@ -2,7 +2,7 @@ from fastapi import APIRouter, Request, Depends, Form, status
 from fastapi.responses import RedirectResponse, JSONResponse
 from fastapi.exceptions import HTTPException
 from fastapi.templating import Jinja2Templates
-from db.database import context_get_conn
+from db.database import conn_scope, read_conn_scope
 from services import auth_svc
 from schemas.auth_schema import UserDataPASS
 from sqlalchemy import Connection
@@ -31,19 +31,22 @@ async def register_user_ui(request: Request):
     )
 
 @router.post("/register")
-async def register_user(name: str = Form(min_length=2, max_length=100),
+async def register_user(request: Request,
+                        name: str = Form(min_length=2, max_length=100),
                         email: EmailStr = Form(...),
-                        password: str = Form(min_length=2, max_length=30),
-                        conn: Connection = Depends(context_get_conn)):
+                        password: str = Form(min_length=2, max_length=30)):
     
-    user = await auth_svc.get_user_by_email(conn=conn, email=email)
+    async with read_conn_scope(request) as conn:
+        user = await auth_svc.get_user_by_email(conn=conn, email=email)
     if user is not None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                             detail="해당 Email은 이미 등록되어 있습니다. ")
     
+    # bcrypt hash 계산 중에는 connection을 점유하지 않음. 
     hashed_password = get_hashed_password(password)
-    await auth_svc.register_user(conn=conn, name=name, email=email, 
-                           hashed_password=hashed_password)
+    async with conn_scope(request) as conn:
+        await auth_svc.register_user(conn=conn, name=name, email=email, 
+                               hashed_password=hashed_password)
     
     return RedirectResponse("/blogs", status_code=status.HTTP_302_FOUND)
     
@@ -60,10 +63,10 @@ async def login_ui(request: Request):
 @router.post("/login")
 async def login(request: Request,
                 email: EmailStr = Form(...),
-                password: str = Form(min_length=2, max_length=30),
-                conn: Connection = Depends(context_get_conn)):
+                password: str = Form(min_length=2, max_length=30)):
     # 입력 email로 db에 사용자가 등록되어 있는지 확인. 
-    userpass = await auth_svc.get_userpass_by_email(conn=conn, email=email)
+    async with read_conn_scope(request) as conn:
+        userpass = await auth_svc.get_userpass_by_email(conn=conn, email=email)
     if userpass is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail="해당 이메일 사용자는 존재하지 않습니다.")
@@ -73,14 +76,22 @@ async def login(request: Request,
     if not is_correct_pw:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail="등록하신 이메일과 패스워드 정보가 입력 정보와 다릅니다.")
-    request.state.session["session_user"] = {"id": userpass.id, "name": userpass.name,
-                                       "email": userpass.email }
+    await auth_svc.set_session_user(request, {"id": userpass.id, "name": userpass.name,
+                                              "email": userpass.email })
     # print("request.session:", request.session)
     return RedirectResponse("/blogs", status_code=status.HTTP_302_FOUND)
 
 @router.get("/logout")
 async def logout(request: Request):
-    request.state.session.clear() #dictionary clear
+    await auth_svc.clear_session_user(request)
+    return RedirectResponse("/blogs", status_code=status.HTTP_302_FOUND)
+
+# 모든 브라우저(기기)의 session을 로그아웃. 
+@router.get("/logout_all")
+async def logout_all(request: Request,
+                     session_user = Depends(auth_svc.get_session_user_prt)):
+    await auth_svc.revoke_all_sessions(session_user["id"])
+    await auth_svc.clear_session_user(request)
     return RedirectResponse("/blogs", status_code=status.HTTP_302_FOUND)
 
     
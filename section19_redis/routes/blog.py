@@ -1,51 +1,109 @@
 from fastapi import APIRouter, Request, Depends, Form, UploadFile, File, status
-from fastapi.responses import RedirectResponse, JSONResponse
+from fastapi.responses import RedirectResponse, JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.templating import Jinja2Templates
 from fastapi.exceptions import HTTPException
-from db.database import context_get_conn
+from db.database import conn_scope, read_conn_scope
 from sqlalchemy import Connection
 from services import blog_svc, auth_svc
 from utils import util
 from schemas.blog_schema import BlogInput
+from typing import Literal
+from dotenv import load_dotenv
+import jinja2
+import os
 
 # router 생성
 router = APIRouter(prefix="/blogs", tags=["blogs"])
 # jinja2 Template 엔진 생성
 templates = Jinja2Templates(directory="templates")
 
+# STREAM_TEMPLATES=true 이면 /blogs 목록을 async jinja2로 rendering하면서 바로 전송. 
+# 첫 화면은 빨리 보이지만, DB connection을 응답 전송이 끝날 때까지 점유하므로 
+# 느린 client가 많으면 pool이 부족해질 수 있음. 기본값(false)은 조회 후 바로 반납하고 rendering. 
+load_dotenv()
+STREAM_TEMPLATES = os.getenv("STREAM_TEMPLATES", "false").lower() == "true"
+async_templates = jinja2.Environment(loader=jinja2.FileSystemLoader("templates"),
+                                     autoescape=jinja2.select_autoescape(),
+                                     enable_async=True)
+
 @router.get("/")
-async def get_all_blogs(request: Request, conn: Connection = Depends(context_get_conn)
+async def get_all_blogs(request: Request
+                        , cursor: str | None = None
+                        , direction: Literal["next", "prev"] = "next"
+                        , page_size: int = blog_svc.PAGE_SIZE
                         , session_user = Depends(auth_svc.get_session_user_opt)):
-    all_blogs = await blog_svc.get_all_blogs(conn)
+    # 목록 버전이 바뀌지 않았으면 DB 조회와 template rendering 없이 304 응답. 
+    headers = {}
+    list_version = await blog_svc.get_list_version()
+    if list_version is not None:
+        etag = util.make_etag("blogs", list_version, request.url.query,
+                              auth_svc.get_auth_state(session_user))
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if util.is_not_modified(request.headers, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if STREAM_TEMPLATES and direction == "next":
+        # navbar와 앞쪽 블로그는 나머지 row를 DB에서 가져오는 동안 먼저 전송됨.
+        # connection 획득과 첫 row 조회는 header 전송 전에 수행해서 오류 시 503 응답. 
+        page = await blog_svc.BlogStream(cursor=cursor, page_size=page_size).open()
+        template = async_templates.get_template("index.html")
+        chunks = template.generate_async(request=request, page=page, 
+                                         session_user=session_user)
+        # 순회하지 못하고 응답이 끝난 경우(client 연결 종료 등)에도 connection 반납. 
+        return StreamingResponse(util.buffer_chunks(chunks), 
+                                 media_type="text/html; charset=utf-8", headers=headers,
+                                 background=BackgroundTask(page.close))
+
+    # connection은 조회가 끝나면 바로 반납하고, rendering과 응답 전송은 connection 없이 수행. 
+    async with read_conn_scope(request) as conn:
+        page = await blog_svc.get_all_blogs(conn, cursor=cursor, 
+                                            direction=direction, page_size=page_size)
     print("session_user:", session_user)
     
     
-    return templates.TemplateResponse(
+    response = templates.TemplateResponse(
         request = request,
         name = "index.html",
-        context = {"all_blogs": all_blogs,
+        context = {"page": page,
                    "session_user": session_user}
     )
+    response.headers.update(headers)
+    return response
     
 @router.get("/show/{id}")
 async def get_blog_by_id(request: Request, id: int,
-                   conn: Connection = Depends(context_get_conn),
                    session_user = Depends(auth_svc.get_session_user_opt)):
-    blog = await blog_svc.get_blog_by_id(conn, id)
-    blog.content = util.newline_to_br(blog.content)
+    # local -> Redis 캐시 -> DB 순서로 조회. 캐시 hit이면 DB connection을 사용하지 않음.
+    async with read_conn_scope(request) as conn:
+        blog = await blog_svc.get_blog_by_id(conn, id)
+    if session_user:
+        session_user['lastviewed_blog_id'] = id
+    etag = util.make_etag(id, blog.modified_dt, auth_svc.get_auth_state(session_user))
+    # 브라우저가 validator를 보낸 경우에만 비교해서, 캐시가 유효하면 rendering 없이 304 응답.
+    if util.has_validators(request.headers) and util.is_not_modified(request.headers, etag, 
+                                                                      blog.modified_dt):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED,
+                        headers=get_validator_headers(etag, blog.modified_dt))
 
     is_valid_auth = auth_svc.check_valid_auth(session_user, 
                                               blog_author_id=blog.author_id, 
                                               blog_email=blog.email)
-    if session_user:
-        session_user['lastviewed_blog_id'] = blog.id
 
-    return templates.TemplateResponse(
+    response = templates.TemplateResponse(
         request = request,
         name="show_blog.html",
         context = {"blog": blog,
                    "session_user": session_user,
                    "is_valid_auth": is_valid_auth})
+    response.headers.update(get_validator_headers(etag, blog.modified_dt))
+    return response
+
+def get_validator_headers(etag: str, modified_dt) -> dict:
+    # no-cache: 브라우저가 캐시는 하되 매번 ETag로 재검증하도록 함.
+    return {"ETag": etag,
+            "Last-Modified": util.http_date(modified_dt),
+            "Cache-Control": "no-cache"}
  
 @router.get("/new")
 async def create_blog_ui(request: Request
@@ -62,7 +120,6 @@ async def create_blog(request: Request
                 , title = Form(min_length=2, max_length=200)
                 , content = Form(min_length=2, max_length=4000)
                 , imagefile: UploadFile | None = File(None)
-                , conn: Connection = Depends(context_get_conn)
                 , session_user = Depends(auth_svc.get_session_user_prt)):
     # print("##### imagefile:", imagefile)
     # print("#### filename:", imagefile.filename)
@@ -71,10 +128,9 @@ async def create_blog(request: Request
     author_id = session_user["id"]
     if len(imagefile.filename.strip()) > 0:
         # 반드시 transactional 한 처리를 위해 upload_file()이 먼저 수행되어야 함.
+        # 파일 저장 중에는 connection을 점유하지 않음. 
         image_loc = await blog_svc.upload_file(author=author, imagefile=imagefile)
-        await blog_svc.create_blog(conn, title=title, author_id=author_id
-                         , content=content, image_loc=image_loc)
-    else:
+    async with conn_scope(request) as conn:
         await blog_svc.create_blog(conn, title=title, author_id=author_id
                          , content=content, image_loc=image_loc)
 
@@ -84,10 +140,10 @@ async def create_blog(request: Request
 
 @router.get("/modify/{id}")
 async def update_blog_ui(request: Request, id: int, 
-                         conn = Depends(context_get_conn),
                          session_user = Depends(auth_svc.get_session_user_prt)
                          ):
-    blog = await blog_svc.get_blog_by_id(conn, id=id)
+    async with read_conn_scope(request) as conn:
+        blog = await blog_svc.get_blog_by_id(conn, id=id)
     is_valid_auth = auth_svc.check_valid_auth(session_user, 
                                               blog_author_id=blog.author_id, 
                                               blog_email=blog.email)
@@ -107,10 +163,10 @@ async def update_blog(request: Request, id: int
                 , title = Form(min_length=2, max_length=200)
                 , content = Form(min_length=2, max_length=4000)
                 , imagefile: UploadFile | None = File(None)
-                , conn: Connection = Depends(context_get_conn)
                 , session_user = Depends(auth_svc.get_session_user_prt)):
     
-    blog = await blog_svc.get_blog_by_id(conn, id=id)
+    async with read_conn_scope(request) as conn:
+        blog = await blog_svc.get_blog_by_id(conn, id=id)
     is_valid_auth = auth_svc.check_valid_auth(session_user, 
                                               blog_author_id=blog.author_id, 
                                               blog_email=blog.email)
@@ -121,9 +177,7 @@ async def update_blog(request: Request, id: int
     author = session_user["name"]
     if len(imagefile.filename.strip()) > 0:
         image_loc = await blog_svc.upload_file(author=author, imagefile=imagefile)
-        await blog_svc.update_blog(conn=conn, id=id, title=title
-                             , content=content, image_loc = image_loc)
-    else:
+    async with conn_scope(request) as conn:
         await blog_svc.update_blog(conn=conn, id=id, title=title
                              , content=content, image_loc = image_loc)
 
@@ -131,15 +185,15 @@ async def update_blog(request: Request, id: int
     
 @router.delete("/delete/{id}")
 async def delete_blog(request: Request, id: int
-                , conn: Connection = Depends(context_get_conn)
                 , session_user = Depends(auth_svc.get_session_user_prt)):
-    blog = await blog_svc.get_blog_by_id(conn=conn, id=id)
-    is_valid_auth = auth_svc.check_valid_auth(session_user, 
-                                              blog_author_id=blog.author_id, 
-                                              blog_email=blog.email)
-    if not is_valid_auth:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
-                            detail="해당 서비스는 권한이 없습니다")
-    await blog_svc.delete_blog(conn=conn, id=id, image_loc=blog.image_loc)
+    async with conn_scope(request) as conn:
+        blog = await blog_svc.get_blog_by_id(conn=conn, id=id)
+        is_valid_auth = auth_svc.check_valid_auth(session_user, 
+                                                  blog_author_id=blog.author_id, 
+                                                  blog_email=blog.email)
+        if not is_valid_auth:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                                detail="해당 서비스는 권한이 없습니다")
+        await blog_svc.delete_blog(conn=conn, id=id, image_loc=blog.image_loc)
     return JSONResponse(content="메시지가 삭제되었습니다", status_code=status.HTTP_200_OK)
     # return RedirectResponse("/blogs", status_code=status.HTTP_302_FOUND)
@@ -0,0 +1,68 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from db.database import pool_metrics, read_pool_metrics
+from db.redis_db import async_redis_pool
+from services import blog_svc, auth_svc
+
+# router 생성
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+# circuit breaker 상태를 숫자로 표시. 
+BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_metric(name: str, value, labels: dict = None) -> str:
+    if labels:
+        label_str = ",".join(f'{key}="{escape_label(val)}"' for key, val in labels.items())
+        return f"{name}{{{label_str}}} {value}"
+    return f"{name} {value}"
+
+def stats_lines(prefix: str, stats: dict, labels: dict = None) -> list:
+    # 숫자 값만 출력. 
+    return [format_metric(f"{prefix}_{key}", value, labels) for key, value in stats.items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)]
+
+async def collect_metrics() -> list:
+    lines = []
+    # DB connection pool(쓰기용 engine, 조회 전용 read_engine)
+    for pool_name, metrics in (("write", pool_metrics), ("read", read_pool_metrics)):
+        lines += stats_lines("db_pool", metrics.get_stats(), {"pool": pool_name})
+        for route, stats in metrics.route_hold.items():
+            lines += stats_lines("db_route_hold", stats, {"pool": pool_name, "route": route})
+    # Redis connection pool
+    lines += stats_lines("redis_pool", async_redis_pool.get_stats())
+    # blog/page 캐시
+    lines += stats_lines("blog_cache", blog_svc.blog_cache.stats)
+    lines += stats_lines("page_cache", blog_svc.page_cache.stats)
+    lines.append(format_metric("page_cache_bytes", blog_svc.page_cache.total_bytes))
+    # session 저장소: circuit breaker 상태와 shard별 통계
+    session_store = auth_svc.session_store
+    # circuit breaker는 저장소 전체에 하나, 또는 sharded 저장소의 node별로 하나. 
+    if hasattr(session_store, "breaker"):
+        breakers = {"all": session_store.breaker}
+    elif hasattr(session_store, "get_breakers"):
+        breakers = session_store.get_breakers()
+    else:
+        breakers = {}
+    for node, breaker in breakers.items():
+        breaker_stats = breaker.get_stats()
+        lines.append(format_metric("session_breaker_state", BREAKER_STATES[breaker_stats["state"]], 
+                                   {"node": node}))
+        lines += stats_lines("session_breaker", breaker_stats, {"node": node})
+    if hasattr(session_store, "get_stats"):
+        for node, stats in session_store.get_stats().items():
+            lines += stats_lines("session_shard", stats, {"node": node})
+    # node별 key 건수(DBSIZE). 조회에 실패한 node는 생략. 
+    if hasattr(session_store, "key_counts"):
+        for node, count in (await session_store.key_counts()).items():
+            if count is not None:
+                lines.append(format_metric("session_shard_keys", count, {"node": node}))
+    return lines
+
+# Prometheus text 형식(version 0.0.4)
+@router.get("", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse("\n".join(await collect_metrics()) + "\n",
+                             media_type="text/plain; version=0.0.4")
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional, Annotated
+from typing import Optional, Annotated, List
 from pydantic.dataclasses import dataclass
 
 class BlogInput(BaseModel):
@@ -20,7 +20,13 @@ class BlogData(BaseModel):
     author_id: int
     author: str | None = None
     email: str  | None = None
-    content: str
+    content: str | None = None
+    summary: str | None = None
+    content_html: str | None = None
     modified_dt: datetime
     image_loc: str | None = None
-     
\ No newline at end of file
+
+class BlogPage(BaseModel):
+    blogs: List[BlogData]
+    next_cursor: str | None = None
+    prev_cursor: str | None = None
@@ -5,6 +5,7 @@ from schemas.blog_schema import BlogData
 from sqlalchemy import text, Connection
 from sqlalchemy.exc import SQLAlchemyError
 from utils import util
+from utils.session_store import create_session_store, is_store_writable
 from typing import List
 from dotenv import load_dotenv
 import os
@@ -33,6 +34,8 @@ async def get_user_by_email(conn: Connection, email: str) -> UserData:
         print(e)
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                             detail="요청하신 서비스가 잠시 내부적으로 문제가 발생하였습니다.")
+    except HTTPException:
+        raise
     except Exception as e:
         print(e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -62,6 +65,8 @@ async def get_userpass_by_email(conn: Connection, email: str) -> UserDataPASS:
         print(e)
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                             detail="요청하신 서비스가 잠시 내부적으로 문제가 발생하였습니다.")
+    except HTTPException:
+        raise
     except Exception as e:
         print(e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -84,19 +89,86 @@ async def register_user(conn: Connection, name: str, email:str, hashed_password:
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                             detail="요청하신 서비스가 잠시 내부적으로 문제가 발생하였습니다.")
     
-def get_session(request: Request):
-    return request.session
+# request.state.session은 처음 사용할 때 Redis에서 load 됨. 
+async def get_session(request: Request):
+    return await request.state.session.load()
 
-def get_session_user_opt(request: Request):
-    if "session_user" in request.state.session.keys():
-        return request.state.session["session_user"]
+load_dotenv()
+# SESSION_STORE 환경변수(redis, redis_hash, redis_sharded, memory, sql)로 session 저장소 선택. 
+# main.py의 RedisSessionMiddleware와 user별 session 목록 관리에서 같이 사용. 
+session_store = create_session_store(os.getenv("SESSION_STORE", "redis"))
+
+# identity cookie(hybrid session)를 사용하면 로그인 사용자 정보는 Redis 조회 없이 cookie에서 가져옴.
+def get_identity(request: Request):
+    return getattr(request.state, "identity", None)
+
+async def get_session_user_opt(request: Request):
+    identity = get_identity(request)
+    if identity is not None:
+        return identity.user
+    session = await request.state.session.load()
+    if "session_user" in session.keys():
+        return session["session_user"]
     
-def get_session_user_prt(request: Request):
-    if "session_user" not in request.state.session.keys():
+async def get_session_user_prt(request: Request):
+    session_user = await get_session_user_opt(request)
+    if session_user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail="해당 서비스는 로그인이 필요합니다.")
-    return request.state.session["session_user"]
+    return session_user
+
+async def set_session_user(request: Request, session_user: dict):
+    # session 저장소 장애 중(읽기 전용)에는 login 불가. 
+    if not is_store_writable(session_store, request.state.session.ensure_session_id()):
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="요청하신 서비스가 잠시 내부적으로 문제가 발생하였습니다.")
+    session = await request.state.session.load()
+    identity = get_identity(request)
+    if identity is not None:
+        identity.user = session_user
+        identity.mark_validated()
+        # 서버 측에서 session을 만료시킬 수 있도록 Redis session에는 user_id를 저장. 
+        session["user_id"] = session_user["id"]
+    else:
+        session["session_user"] = session_user
+    # 사용자의 모든 session을 만료시킬 수 있도록 user별 session 목록에 등록. 
+    try:
+        await session_store.add_user_session(session_user["id"], 
+                                             request.state.session.ensure_session_id())
+    except Exception as e:
+        # 등록에 실패해도 login은 진행. 
+        print(e)
+
+async def clear_session_user(request: Request):
+    lazy_session = request.state.session
+    session_user = await get_session_user_opt(request)
+    if session_user is not None and lazy_session.session_id:
+        try:
+            await session_store.remove_user_session(session_user["id"], lazy_session.session_id)
+        except Exception as e:
+            # 남은 id는 session이 만료되면 목록 조회 시 정리됨. 
+            print(e)
+    lazy_session.clear()
+    identity = get_identity(request)
+    if identity is not None:
+        identity.user = None
+
+async def revoke_all_sessions(user_id: int) -> int:
+    # 비밀번호 변경, 계정 도용 등으로 사용자의 모든 session을 만료. 
+    # identity cookie를 사용하는 다른 브라우저는 갱신 주기(identity_renew_after)가 지나면 로그아웃됨. 
+    try:
+        return await session_store.revoke_user_sessions(user_id)
+    except Exception as e:
+        print(e)
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="요청하신 서비스가 잠시 내부적으로 문제가 발생하였습니다.")
    
+# 같은 페이지라도 로그인 사용자별로 navbar, 수정/삭제 버튼이 달라지므로 ETag에 포함. 
+def get_auth_state(session_user: dict) -> str:
+    if session_user is None:
+        return "anonymous"
+    return f"{session_user['id']}:{session_user.get('lastviewed_blog_id')}"
+
 def check_valid_auth(session_user: dict, blog_author_id: int, blog_email: str):
     if session_user is None:
         return False
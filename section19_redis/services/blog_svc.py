@@ -2,8 +2,12 @@ from fastapi import status, UploadFile
 from fastapi.exceptions import HTTPException
 from sqlalchemy import text, Connection
 from sqlalchemy.exc import SQLAlchemyError
-from schemas.blog_schema import BlogData
+from schemas.blog_schema import BlogData, BlogPage
 from utils import util
+from utils.cache import ReadThroughCache, PageCache
+from db.redis_db import async_redis_client
+from db.database import direct_get_conn
+from redis.exceptions import RedisError
 from typing import List
 from dotenv import load_dotenv
 import os
@@ -13,45 +17,198 @@ import aiofiles as aio
 load_dotenv()
 UPLOAD_DIR = os.getenv("UPLOAD_DIR")
 
+# get_blog_by_id()용 캐시. local(10초) -> Redis(300초) -> DB 순서로 조회.
+blog_cache = ReadThroughCache("blog", async_redis_client, BlogData, 
+                              ttl=300, local_ttl=10, local_maxsize=1024)
+# 익명 사용자의 /blogs, /blogs/show/{id} 페이지 캐시. PageCacheMiddleware에서 사용.
+page_cache = PageCache(async_redis_client, max_bytes=32 * 1024 * 1024, ttl=60)
+# blog가 작성/수정/삭제될 때마다 증가하는 목록 버전. /blogs 목록의 ETag에 사용.
+LIST_VERSION_KEY = "blog:list_version"
 
-async def get_all_blogs(conn: Connection) -> List:
+
+# 한 페이지당 블로그 건수. page_size 요청값은 PAGE_SIZE_MAX로 제한.
+PAGE_SIZE = 10
+PAGE_SIZE_MAX = 50
+# streaming rendering은 메모리에 모든 row를 올리지 않으므로 더 큰 page를 허용. 
+STREAM_PAGE_SIZE_MAX = 1000
+
+def parse_cursor(cursor: str | None) -> tuple:
+    if not cursor:
+        return None, None
     try:
-        query = """
-        SELECT a.id, title, author_id, b.name as author, b.email as email, content, 
-        case when image_loc is null then '/static/default/blog_default.png'
-             else image_loc end as image_loc
-        , modified_dt 
-        FROM blog a
-          join user b on a.author_id = b.id
-        order by modified_dt desc;
-        """
-        result = await conn.execute(text(query))
-        all_blogs = [BlogData(id=row.id,
+        return util.decode_cursor(cursor)
+    except ValueError as e:
+        print(e)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="잘못된 페이지 정보입니다.")
+
+def build_blog_list_stmt(cursor_dt, cursor_id, is_prev: bool, limit: int):
+    # (modified_dt, id) 복합 인덱스를 타고 cursor 위치부터 limit 건만 읽는다.
+    if cursor_dt is None:
+        where_clause = ""
+    elif is_prev:
+        where_clause = """where a.modified_dt >= :cursor_dt
+          and (a.modified_dt > :cursor_dt or a.id > :cursor_id)"""
+    else:
+        where_clause = """where a.modified_dt <= :cursor_dt
+          and (a.modified_dt < :cursor_dt or a.id < :cursor_id)"""
+    order = "asc" if is_prev else "desc"
+
+    query = f"""
+    SELECT a.id, title, author_id, b.name as author, b.email as email, summary, 
+    case when summary is null then content end as content,
+    case when image_loc is null then '/static/default/blog_default.png'
+         else image_loc end as image_loc
+    , modified_dt 
+    FROM blog a
+      join user b on a.author_id = b.id
+    {where_clause}
+    order by a.modified_dt {order}, a.id {order}
+    limit :limit
+    """
+    stmt = text(query).bindparams(limit=limit)
+    if cursor_dt is not None:
+        stmt = stmt.bindparams(cursor_dt=cursor_dt, cursor_id=cursor_id)
+    return stmt
+
+def row_to_blog_summary(row) -> BlogData:
+    # backfill 되지 않은 기존 데이터는 summary가 null이므로 content로 조회 시점에 계산. 
+    summary = row.summary if row.summary is not None else util.truncate_text(row.content or "")
+    return BlogData(id=row.id,
               title=row.title,
               author_id=row.author_id,
               author=row.author,
               email=row.email,
-              content=util.truncate_text(row.content),
+              summary=summary,
               image_loc=row.image_loc, 
-              modified_dt=row.modified_dt) for row in result]
-    
+              modified_dt=row.modified_dt)
+
+async def get_all_blogs(conn: Connection, cursor: str = None,
+                        direction: str = "next", page_size: int = PAGE_SIZE) -> BlogPage:
+    page_size = max(1, min(page_size, PAGE_SIZE_MAX))
+    cursor_dt, cursor_id = parse_cursor(cursor)
+    is_prev = cursor is not None and direction == "prev"
+
+    try:
+        # 1건을 더 읽어서 다음(이전) 페이지가 있는지 확인. 
+        stmt = build_blog_list_stmt(cursor_dt, cursor_id, is_prev, limit=page_size + 1)
+        result = await conn.execute(stmt)
+        rows = result.fetchall()
         result.close()
-        return all_blogs
+
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if is_prev:
+            rows.reverse()
+
+        all_blogs = [row_to_blog_summary(row) for row in rows]
+
+        next_cursor, prev_cursor = None, None
+        if all_blogs:
+            first, last = all_blogs[0], all_blogs[-1]
+            if is_prev:
+                next_cursor = util.encode_cursor(last.modified_dt, last.id)
+                if has_more:
+                    prev_cursor = util.encode_cursor(first.modified_dt, first.id)
+            else:
+                if has_more:
+                    next_cursor = util.encode_cursor(last.modified_dt, last.id)
+                if cursor is not None:
+                    prev_cursor = util.encode_cursor(first.modified_dt, first.id)
+
+        return BlogPage(blogs=all_blogs, next_cursor=next_cursor, prev_cursor=prev_cursor)
     except SQLAlchemyError as e:
         print(e)
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                             detail="요청하신 서비스가 잠시 내부적으로 문제가 발생하였습니다.")
+    except HTTPException:
+        # 404, pool 대기열 초과(503) 등은 그대로 전달.
+        raise
     except Exception as e:
         print(e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                             detail="알수없는 이유로 서비스 오류가 발생하였습니다")
 
 
+class BlogStream:
+    """
+    streaming rendering용 목록 페이지. template에서 blogs를 async for로 순회하는 동안 
+    conn.stream()으로 한 row씩 DB에서 가져오며, 순회가 끝나면 next/prev cursor가 채워짐. 
+    response header를 보내기 전에 open()으로 connection 획득과 첫 row 조회를 마쳐서, 
+    pool 대기열 초과나 DB 오류는 일반 503 오류 페이지로 응답. 
+    connection은 순회가 끝나거나 close()(응답 종료 후 background task)에서 반납. 
+    """
+    def __init__(self, cursor: str = None, page_size: int = PAGE_SIZE):
+        self.cursor = cursor
+        self.cursor_dt, self.cursor_id = parse_cursor(cursor)
+        self.page_size = max(1, min(page_size, STREAM_PAGE_SIZE_MAX))
+        self.next_cursor = None
+        self.prev_cursor = None
+        self._conn = None
+        self._result = None
+        self._first_row = None
+        self.blogs = self._iterate()
+
+    async def open(self):
+        self._conn = await direct_get_conn(read_only=True)
+        try:
+            stmt = build_blog_list_stmt(self.cursor_dt, self.cursor_id, 
+                                        is_prev=False, limit=self.page_size + 1)
+            self._result = await self._conn.stream(stmt)
+            self._first_row = await self._result.fetchone()
+        except SQLAlchemyError as e:
+            print(e)
+            await self.close()
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="요청하신 서비스가 잠시 내부적으로 문제가 발생하였습니다.")
+        return self
+
+    async def close(self):
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        try:
+            if self._result is not None:
+                await self._result.close()
+        finally:
+            await conn.close()
+
+    async def _rows(self):
+        if self._first_row is None:
+            return
+        yield self._first_row
+        async for row in self._result:
+            yield row
+
+    async def _iterate(self):
+        try:
+            count = 0
+            last = None
+            async for row in self._rows():
+                if count == self.page_size:
+                    # page_size + 1 번째 row가 있으면 다음 페이지가 존재.
+                    self.next_cursor = util.encode_cursor(last.modified_dt, last.id)
+                    break
+                last = row_to_blog_summary(row)
+                if count == 0 and self.cursor is not None:
+                    self.prev_cursor = util.encode_cursor(last.modified_dt, last.id)
+                count += 1
+                yield last
+        except SQLAlchemyError as e:
+            # 첫 row 이후의 오류는 이미 response header가 전송되었으므로 로그만 남기고 응답을 중단. 
+            print(e)
+            raise
+        finally:
+            await self.close()
+
 async def get_blog_by_id(conn: Connection, id: int):
+    return await blog_cache.get_or_load(id, lambda: select_blog_by_id(conn, id))
+
+async def select_blog_by_id(conn: Connection, id: int):
     try:
         query = f"""
         SELECT a.id, title, author_id, b.name as author, b.email as email
-        , content, image_loc, modified_dt 
+        , content, content_html, image_loc, modified_dt 
         from blog a
            join user b on a.author_id = b.id
         where a.id = :id
@@ -68,7 +225,11 @@ async def get_blog_by_id(conn: Connection, id: int):
         blog = BlogData(id=row.id, title=row.title, author_id=row.author_id,
                         author=row.author, email=row.email, 
                         content=row.content,
+                        content_html=row.content_html,
                         image_loc=row.image_loc, modified_dt=row.modified_dt)
+        # backfill 되지 않은 기존 데이터는 조회 시점에 변환. 
+        if blog.content_html is None:
+            blog.content_html = util.content_to_html(blog.content)
         if blog.image_loc is None:
             blog.image_loc = '/static/default/blog_default.png'
         
@@ -79,11 +240,36 @@ async def get_blog_by_id(conn: Connection, id: int):
         print(e)
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                             detail="요청하신 서비스가 잠시 내부적으로 문제가 발생하였습니다.")
+    except HTTPException:
+        raise
     except Exception as e:
         print(e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                             detail="알수없는 이유로 서비스 오류가 발생하였습니다")
 
+async def get_list_version() -> str | None:
+    # Redis 장애 시에는 None을 반환하고, 호출하는 쪽에서 conditional GET을 생략.
+    try:
+        version = await async_redis_client.get(LIST_VERSION_KEY)
+        if version is None:
+            # Redis가 초기화된 경우에도 이전 ETag와 겹치지 않도록 현재 시각으로 시작. 
+            await async_redis_client.set(LIST_VERSION_KEY, time.time_ns(), nx=True)
+            version = await async_redis_client.get(LIST_VERSION_KEY)
+        return version.decode("utf-8")
+    except RedisError as e:
+        print(e)
+        return None
+
+# blog 작성/수정/삭제 후 관련 캐시를 모두 무효화. 
+async def invalidate_blog_caches(id: int = None):
+    if id is not None:
+        await blog_cache.invalidate(id)
+    await page_cache.purge()
+    try:
+        await async_redis_client.incr(LIST_VERSION_KEY)
+    except RedisError as e:
+        print(e)
+
 async def upload_file(author: str, imagefile: UploadFile = None):
     try:
         user_dir = f"{UPLOAD_DIR}/{author}/"
@@ -110,13 +296,19 @@ async def upload_file(author: str, imagefile: UploadFile = None):
 async def create_blog(conn: Connection, title:str, author_id: int, 
                 content:str, image_loc = None):
     try:
+        # 목록 화면용 summary와 상세 화면용 content_html은 저장 시점에 한번만 계산. 
         query = f"""
-        INSERT INTO blog(title, author_id, content, image_loc, modified_dt)
-        values ('{title}', {author_id}, '{content}', {util.none_to_null(image_loc, is_squote=True)} , now())
+        INSERT INTO blog(title, author_id, content, summary, content_html, image_loc, modified_dt)
+        values (:title, :author_id, :content, :summary, :content_html, :image_loc, now())
         """
-        
-        await conn.execute(text(query))
+        bind_stmt = text(query).bindparams(title=title, author_id=author_id,
+                                           content=content,
+                                           summary=util.truncate_text(content),
+                                           content_html=util.content_to_html(content),
+                                           image_loc=image_loc)
+        await conn.execute(bind_stmt)
         await conn.commit()
+        await invalidate_blog_caches()
         
     except SQLAlchemyError as e:
         print(e)
@@ -133,12 +325,15 @@ async def update_blog(conn: Connection,  id: int
     try:
         query = f"""
         UPDATE blog 
-        SET title = :title, content= :content
-        , image_loc = :image_loc
+        SET title = :title, content= :content, summary = :summary
+        , content_html = :content_html
+        , image_loc = :image_loc, modified_dt = now()
         where id = :id
         """
         bind_stmt = text(query).bindparams(id=id, title=title, 
                                            content=content,
+                                           summary=util.truncate_text(content),
+                                           content_html=util.content_to_html(content),
                                            image_loc=image_loc)
         result = await conn.execute(bind_stmt)
         # 해당 id로 데이터가 존재하지 않아 update 건수가 없으면 오류를 던진다.
@@ -146,6 +341,7 @@ async def update_blog(conn: Connection,  id: int
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                                 detail=f"해당 id {id}는(은) 존재하지 않습니다.")
         await conn.commit()
+        await invalidate_blog_caches(id)
         
     except SQLAlchemyError as e:
         print(e)
@@ -168,6 +364,7 @@ async def delete_blog(conn: Connection, id: int, image_loc: str = None):
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                                 detail=f"해당 id {id}는(은) 존재하지 않습니다.")
         await conn.commit()
+        await invalidate_blog_caches(id)
 
         if image_loc is not None:
             image_path = "." + image_loc
@@ -180,6 +377,8 @@ async def delete_blog(conn: Connection, id: int, image_loc: str = None):
         await conn.rollback()
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                             detail="요청하신 서비스가 잠시 내부적으로 문제가 발생하였습니다.")
+    except HTTPException:
+        raise
     except Exception as e:
         print(e)
         await conn.rollback()
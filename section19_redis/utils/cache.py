@@ -0,0 +1,288 @@
+from pydantic import BaseModel
+from collections import OrderedDict
+from redis.exceptions import RedisError
+import redis.asyncio as aioredis
+import asyncio
+import logging
+import gzip
+import random
+import math
+import time
+import json
+
+class LocalTTLCache:
+    """프로세스 내부 LRU + TTL 캐시. 값과 함께 만료 시각을 저장."""
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.time():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, expires_at: float):
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# KEYS[2](version key)의 값이 load를 시작할 때 읽은 version(ARGV[3], 없으면 '')과 같을 때만 
+# KEYS[1]에 값을 저장. load 도중 다른 worker가 invalidate 했으면 이전 값을 저장하지 않음. 
+CACHE_SET_SCRIPT = """
+local version = redis.call('GET', KEYS[2]) or ''
+if version ~= ARGV[3] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+return 1
+"""
+
+class ReadThroughCache:
+    """
+    in-process(LocalTTLCache) -> Redis -> DB loader 순서로 읽는 2단계 캐시. 
+    - 같은 key의 동시 miss는 하나의 loader 호출로 합침(single-flight). 
+    - Redis 값이 만료되기 전에 확률적으로 미리 갱신하여(XFetch) 만료 시점의 stampede를 방지. 
+    - invalidate()는 Redis pub/sub으로 모든 worker의 local 캐시를 삭제. 
+    - invalidate()는 key별 version도 증가시키고, Redis 저장은 load 시작 시점과 version이 같을 때만 수행. 
+      (load 도중 수정된 경우 이전 값이 ttl 동안 남지 않도록 함)
+    """
+    def __init__(self, name: str, redis_client: aioredis.Redis, model: type[BaseModel],
+                 ttl: int = 300, local_ttl: int = 10, local_maxsize: int = 1024,
+                 beta: float = 1.0):
+        self.name = name
+        self.redis_client = redis_client
+        self.model = model
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self.beta = beta
+        self.channel = f"{name}:invalidate"
+        self.local = LocalTTLCache(maxsize=local_maxsize)
+        self.set_script = redis_client.register_script(CACHE_SET_SCRIPT)
+        self._inflight: dict = {}
+        # load 도중에 invalidate 될 때마다 증가. load 도중에 invalidate 되었으면 그 결과는 캐시하지 않음.
+        # load 중인 key만 보관하고 load가 끝나면 삭제하므로 invalidate된 key가 계속 쌓이지 않음. 
+        self._generation: dict = {}
+        self.stats = {"local_hits": 0, "redis_hits": 0, "loads": 0, "early_refreshes": 0}
+
+    def _redis_key(self, key) -> str:
+        return f"{self.name}:{key}"
+
+    def _version_key(self, key) -> str:
+        return f"{self.name}:version:{key}"
+
+    def _should_refresh_early(self, delta: float, expires_at: float) -> bool:
+        # XFetch: 재계산 시간(delta)이 길고 만료가 가까울수록 미리 갱신할 확률이 높아짐. 
+        return time.time() - delta * self.beta * math.log(random.random()) >= expires_at
+
+    async def get_or_load(self, key, loader):
+        value = self.local.get(key)
+        if value is not None:
+            self.stats["local_hits"] += 1
+            return value.model_copy()
+
+        while True:
+            fut = self._inflight.get(key)
+            if fut is None:
+                break
+            try:
+                value = await asyncio.shield(fut)
+                return value.model_copy()
+            except asyncio.CancelledError:
+                # leader 요청이 취소된 경우에는 다시 시도, 자기 자신이 취소된 경우는 그대로 전파. 
+                if not fut.cancelled():
+                    raise
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            value = await self._load(key, loader)
+            fut.set_result(value)
+            return value.model_copy()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            # 기다리는 요청이 없더라도 "exception was never retrieved" 경고가 나지 않도록 함.
+            fut.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+            self._generation.pop(key, None)
+
+    async def _load(self, key, loader):
+        generation = self._generation.get(key, 0)
+        # Redis에 저장할 때 비교할 version. 조회에 실패하면 None이며 이때는 Redis에 저장하지 않음. 
+        version = None
+        try:
+            cached, version = await self.redis_client.mget(self._redis_key(key), self._version_key(key))
+            version = version.decode("utf-8") if version else ""
+            if cached:
+                entry = json.loads(cached)
+                if not self._should_refresh_early(entry["delta"], entry["expires_at"]):
+                    self.stats["redis_hits"] += 1
+                    value = self.model.model_validate(entry["value"])
+                    self._set_local(key, value, entry["expires_at"], generation)
+                    return value
+                self.stats["early_refreshes"] += 1
+        except RedisError as e:
+            logging.error(f"error in {self.name} cache get:" + str(e))
+
+        start = time.time()
+        value = await loader()
+        delta = time.time() - start
+        self.stats["loads"] += 1
+
+        expires_at = time.time() + self.ttl
+        if self._generation.get(key, 0) == generation:
+            if version is not None:
+                try:
+                    entry = {"value": value.model_dump(mode="json"), "delta": delta, "expires_at": expires_at}
+                    await self.set_script(keys=[self._redis_key(key), self._version_key(key)], 
+                                          args=[json.dumps(entry), self.ttl, version])
+                except RedisError as e:
+                    logging.error(f"error in {self.name} cache set:" + str(e))
+            self._set_local(key, value, expires_at, generation)
+        return value
+
+    def _set_local(self, key, value, expires_at: float, generation: int):
+        if self._generation.get(key, 0) != generation:
+            return
+        self.local.set(key, value, min(expires_at, time.time() + self.local_ttl))
+
+    def evict_local(self, key):
+        # load 중인 key만 generation을 올림. load 중이 아니면 비교할 대상이 없으므로 기록하지 않음. 
+        if key in self._inflight:
+            self._generation[key] = self._generation.get(key, 0) + 1
+        self.local.delete(key)
+
+    async def invalidate(self, key):
+        self.evict_local(key)
+        try:
+            # version을 먼저 올려서, 이미 시작된 load의 저장(CACHE_SET_SCRIPT)이 DELETE 이후에 도착해도 무시되게 함. 
+            # version key는 진행 중인 load보다 오래만 유지되면 되므로 ttl 후 만료. 
+            async with self.redis_client.pipeline(transaction=True) as pipe:
+                pipe.incr(self._version_key(key))
+                pipe.expire(self._version_key(key), self.ttl)
+                pipe.delete(self._redis_key(key))
+                await pipe.execute()
+            await self.redis_client.publish(self.channel, str(key))
+        except RedisError as e:
+            logging.error(f"error in {self.name} cache invalidate:" + str(e))
+
+    async def listen_invalidation(self, key_type=int, pubsub_client: aioredis.Redis | None = None):
+        # 다른 worker에서 발생한 invalidate 메시지를 받아 local 캐시를 삭제. 
+        # 연결이 끊기면 local 캐시를 모두 비우고 재접속. 
+        await listen_channel(pubsub_client or self.redis_client, self.channel,
+                             on_message=lambda data: self.evict_local(key_type(data)),
+                             on_error=self.local.clear)
+
+
+class PageCache:
+    """
+    익명 사용자용 전체 페이지(HTML) 캐시. body는 gzip으로 압축해서 보관하고, 
+    전체 크기가 max_bytes를 넘으면 가장 오래 사용하지 않은 페이지부터 제거(LRU). 
+    """
+    def __init__(self, redis_client: aioredis.Redis, name: str = "page_cache", 
+                 max_bytes: int = 32 * 1024 * 1024, ttl: int = 60):
+        self.redis_client = redis_client
+        self.channel = f"{name}:purge"
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.total_bytes = 0
+        self._data: OrderedDict = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "purges": 0}
+
+    def get(self, key) -> dict | None:
+        entry = self._data.get(key)
+        if entry is None or entry["expires_at"] <= time.time():
+            if entry is not None:
+                self._remove(key)
+            self.stats["misses"] += 1
+            return None
+        self._data.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry
+
+    def set(self, key, status_code: int, headers: list, body: bytes):
+        gzip_body = gzip.compress(body)
+        size = len(gzip_body) + sum(len(k) + len(v) for k, v in headers)
+        if size > self.max_bytes:
+            return
+        self._remove(key)
+        etag = next((v.decode("latin-1") for k, v in headers if k == b"etag"), None)
+        self._data[key] = {"status_code": status_code, "headers": headers, 
+                           "gzip_body": gzip_body, "size": size, "etag": etag,
+                           "expires_at": time.time() + self.ttl}
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+            oldest_key = next(iter(self._data))
+            self._remove(oldest_key)
+            self.stats["evictions"] += 1
+
+    def _remove(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry["size"]
+
+    def purge_local(self):
+        self._data.clear()
+        self.total_bytes = 0
+        self.stats["purges"] += 1
+
+    async def purge(self):
+        # blog 작성/수정/삭제 시 호출. 모든 worker의 페이지 캐시를 비움. 
+        self.purge_local()
+        try:
+            await self.redis_client.publish(self.channel, "*")
+        except RedisError as e:
+            logging.error("error in page cache purge:" + str(e))
+
+    async def listen_purge(self, pubsub_client: aioredis.Redis | None = None):
+        await listen_channel(pubsub_client or self.redis_client, self.channel,
+                             on_message=lambda data: self.purge_local(),
+                             on_error=self.purge_local)
+
+
+# pub/sub 메시지를 기다리는 최대 시간(초). 메시지가 없으면 None을 받고 다시 대기. 
+LISTEN_POLL_TIMEOUT = 5.0
+
+async def listen_channel(redis_client: aioredis.Redis, channel: str, on_message, on_error):
+    # Redis pub/sub channel을 구독하면서 메시지마다 on_message(data)를 호출.
+    # 연결 오류 시에는 그동안 놓친 메시지가 있을 수 있으므로 on_error()를 호출하고 재접속. 
+    # listen()은 메시지가 없는 동안 socket_timeout이 지나면 TimeoutError를 내므로, 
+    # timeout을 지정한 get_message()로 polling하여 실제 연결 오류만 on_error()로 처리. 
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.subscribe(channel)
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, 
+                                                   timeout=LISTEN_POLL_TIMEOUT)
+                if message is not None and message["type"] == "message":
+                    on_message(message["data"].decode("utf-8"))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"error in {channel} listener:" + str(e))
+            on_error()
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.aclose()
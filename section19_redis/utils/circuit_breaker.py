@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import time
+
+class CircuitOpenError(Exception):
+    """circuit이 open 상태여서 호출하지 않고 바로 실패."""
+    pass
+
+
+class CircuitBreaker:
+    """
+    외부 저장소(Redis 등) 호출을 감싸는 circuit breaker. 
+    - closed: 정상 호출. 연속 실패가 failure_threshold에 도달하면 open. 
+    - open: recovery_timeout 동안 호출하지 않고 CircuitOpenError로 바로 실패(timeout까지 기다리지 않음). 
+    - half_open: recovery_timeout이 지나면 half_open_max_calls개의 요청만 시험 호출. 
+      성공하면 closed, 실패하면 다시 open. 시험 호출이 취소되면 자리를 반납하고, 
+      결과 없이 recovery_timeout이 지난 시험 호출은 끝난 것으로 보고 새 시험 호출을 허용. 
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 10.0,
+                 half_open_max_calls: int = 1, call_timeout: float = None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.call_timeout = call_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._probe_started_at = 0.0
+        self.stats = {"calls": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+        return self._state
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == self.OPEN
+
+    def _expire_stale_probes(self):
+        if (self._half_open_calls >= self.half_open_max_calls 
+                and time.monotonic() - self._probe_started_at >= self.recovery_timeout):
+            self._half_open_calls = 0
+
+    @property
+    def allows_calls(self) -> bool:
+        # 지금 호출하면 거절되지 않는지 여부. (시험 호출 자리를 사용하지 않음)
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN:
+            self._expire_stale_probes()
+            return self._half_open_calls < self.half_open_max_calls
+        return False
+
+    def allow_request(self) -> bool:
+        if not self.allows_calls:
+            return False
+        if self._state == self.HALF_OPEN:
+            self._half_open_calls += 1
+            self._probe_started_at = time.monotonic()
+        return True
+
+    def _release_probe(self):
+        if self._state == self.HALF_OPEN and self._half_open_calls > 0:
+            self._half_open_calls -= 1
+
+    def record_success(self):
+        self._failures = 0
+        self._state = self.CLOSED
+
+    def record_failure(self):
+        self._failures += 1
+        self.stats["failures"] += 1
+        if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                logging.critical(f"circuit breaker {self.name} opened")
+                self.stats["opened"] += 1
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+
+    async def call(self, func, *args, **kwargs):
+        if not self.allow_request():
+            self.stats["rejected"] += 1
+            raise CircuitOpenError(f"circuit breaker {self.name} is open")
+        self.stats["calls"] += 1
+        try:
+            if self.call_timeout is None:
+                result = await func(*args, **kwargs)
+            else:
+                result = await asyncio.wait_for(func(*args, **kwargs), self.call_timeout)
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:
+            # 취소(CancelledError) 등은 성공/실패로 보지 않고 시험 호출 자리만 반납. 
+            self._release_probe()
+            raise
+        self.record_success()
+        return result
+
+    def get_stats(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self._failures, **self.stats}
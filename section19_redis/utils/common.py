@@ -1,13 +1,24 @@
 from fastapi import FastAPI
-from db.database import engine
+from db.database import engine, read_engine
+from db.redis_db import async_redis_client, async_redis_pubsub_client
+from services.blog_svc import blog_cache, page_cache
 from contextlib import asynccontextmanager
+import asyncio
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # FastAPI 인스턴스 기동시 필요한 작업 수행. 
     print("Starting up...")
+    # 다른 worker의 blog 수정/삭제 시 local 캐시를 비우기 위한 pub/sub listener 기동
+    listener_tasks = [asyncio.create_task(blog_cache.listen_invalidation(pubsub_client=async_redis_pubsub_client)),
+                      asyncio.create_task(page_cache.listen_purge(pubsub_client=async_redis_pubsub_client))]
     yield
 
     #FastAPI 인스턴스 종료시 필요한 작업 수행
     print("Shutting down...")
+    for task in listener_tasks:
+        task.cancel()
     await engine.dispose()
+    await read_engine.dispose()
+    await async_redis_client.aclose()
+    await async_redis_pubsub_client.aclose()
@@ -14,7 +14,9 @@ async def custom_http_exception_handler(request: Request, exc: StarletteHTTPExce
             "title_message": "불편을 드려 죄송합니다.",
             "detail": exc.detail
         },
-        status_code=exc.status_code
+        status_code=exc.status_code,
+        # 503의 Retry-After 등 exception에 지정된 header를 그대로 전달. 
+        headers=getattr(exc, "headers", None)
     )
 
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -0,0 +1,58 @@
+from itsdangerous import TimestampSigner, BadSignature
+import base64
+import json
+import time
+
+class Identity:
+    """
+    request.state.identity. 로그인 사용자 정보({id, name, email, ...})를 signed cookie로 주고받음. 
+    user를 변경하거나(예: lastviewed_blog_id) 갱신 주기가 지나면 응답 시 cookie를 다시 sign. 
+    validated_at은 서버 측 session을 마지막으로 확인한 시각. user 변경으로 다시 sign 할 때는 
+    그대로 유지하므로, 계속 값을 바꾸는 요청이 와도 갱신 주기마다 session 확인이 수행됨. 
+    """
+    def __init__(self, user: dict = None, raw: str = None, validated_at: float = None):
+        self.user = user
+        # cookie에서 읽은 원본 user json. 신규이면 None
+        self.raw = raw
+        self.validated_at = validated_at
+        self.renew = False
+
+    def mark_validated(self):
+        # login 직후나 서버 측 session 확인 후 호출. 
+        self.validated_at = time.time()
+        self.renew = True
+
+    @staticmethod
+    def encode_user(user: dict) -> str:
+        return json.dumps(user, separators=(",", ":"), sort_keys=True, ensure_ascii=False)
+
+    @property
+    def needs_signing(self) -> bool:
+        if self.user is None:
+            return False
+        return self.renew or self.encode_user(self.user) != self.raw
+
+
+class IdentitySigner:
+    """HMAC sign + timestamp(itsdangerous). max_age가 지난 cookie는 무효."""
+    def __init__(self, secret_key: str, max_age: int, salt: str = "session-identity"):
+        self.signer = TimestampSigner(secret_key, salt=salt)
+        self.max_age = max_age
+
+    def sign(self, identity: Identity) -> str:
+        data = {"user": identity.user, "validated_at": int(identity.validated_at or 0)}
+        payload = base64.urlsafe_b64encode(Identity.encode_user(data).encode("utf-8"))
+        return self.signer.sign(payload).decode("ascii")
+
+    def unsign(self, cookie: str) -> Identity:
+        try:
+            payload = self.signer.unsign(cookie, max_age=self.max_age)
+            data = json.loads(base64.urlsafe_b64decode(payload).decode("utf-8"))
+            user = data["user"]
+            return Identity(user, raw=Identity.encode_user(user), 
+                            validated_at=float(data["validated_at"]))
+        except (BadSignature, ValueError, KeyError, TypeError):
+            return Identity()
+
+    def validation_age(self, identity: Identity) -> float:
+        return time.time() - (identity.validated_at or 0)
@@ -1,16 +1,24 @@
 from fastapi import Request, FastAPI
+from fastapi.responses import Response
 from starlette.middleware.base import BaseHTTPMiddleware
-import redis
+from starlette.datastructures import MutableHeaders, QueryParams
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Scope, Receive, Send, Message
+from utils.cache import PageCache
+from utils import util
+from utils.session import Session, LazySession
+from utils.session_codec import MsgpackSessionCodec
+from utils.session_store import SessionStore, RedisSessionStore, is_store_writable
+from utils.identity import Identity, IdentitySigner
+from db.redis_db import async_redis_client
 import uuid
 import json
 import logging
+import gzip
+import re
 
 logging.basicConfig(level=logging.CRITICAL) # debugging위해서는 INFO로 변경. 
 
-# Redis setup
-redis_pool = redis.ConnectionPool(host='localhost', port=6379, db=0, max_connections=10)
-redis_client = redis.Redis(connection_pool=redis_pool)
-
 class DummyMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
         print("### request info:", request.url, request.method)
@@ -19,86 +27,258 @@ class DummyMiddleware(BaseHTTPMiddleware):
         response = await call_next(request)
         return response
     
-class MethodOverrideMiddlware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # print("#### request url, query_params, method", 
-        #       request.url, request.query_params, request.method)
-        if request.method == "POST":
-            query = request.query_params
-            if query:
-                method_override = query["_method"]
-                if method_override:
-                    method_override = method_override.upper()
-                    if method_override in ("PUT", "DELETE"):
-                        request.scope["method"] = method_override
-        
-        response = await call_next(request)
-        return response
+# BaseHTTPMiddleware는 요청마다 별도 task와 stream으로 response를 감싸므로, 
+# 아래 middleware들은 scope와 send를 직접 다루는 순수 ASGI middleware로 작성. 
+class MethodOverrideMiddlware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http" and scope["method"] == "POST":
+            # _method 외의 query parameter만 있는 POST 요청도 있으므로 get()으로 확인. 
+            method_override = QueryParams(scope["query_string"]).get("_method")
+            if method_override:
+                method_override = method_override.upper()
+                if method_override in ("PUT", "DELETE"):
+                    scope["method"] = method_override
+
+        await self.app(scope, receive, send)
 
 #코드 자체를 이해하기 보다는 어떻게 전반적으로 구성되어있는지만 알기
 #request.state.session만 어떻게 사용하는지 이해해도됨.
-class RedisSessionMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app: FastAPI, session_cookie: str = "session_redis_id", max_age: int = 3600):
-        super().__init__(app)
+class RedisSessionMiddleware:
+    """
+    - request.state.session은 LazySession. route에서 처음 load() 할 때만 Redis에서 가져옴. 
+    - exclude_paths로 시작하는 요청(static 등)은 session 처리를 하지 않음. 
+    - session 값이 변경된 경우에만 Redis에 저장(SETEX). 
+    - Redis TTL(와 cookie max_age)은 max_age * refresh_ratio 이상 경과했을 때만 갱신. 
+    - session load와 TTL 갱신은 store.get() 한번으로 수행(Redis는 1 round trip). 
+    - session 값은 codec(기본 msgpack)으로 직렬화해서 store(기본 Redis)에 저장. 
+      store가 field 단위 저장(RedisHashSessionStore)을 지원하면 변경된 최상위 key만 저장. 
+    - identity_cookie를 지정하면 로그인 사용자 정보는 signed cookie(request.state.identity)로 
+      주고받아서 Redis 없이 사용. Redis session에는 user_id와 그 외 큰 값만 저장. 
+      마지막 확인 후 identity_renew_after 초가 지나면 Redis session의 user_id를 확인한 후 cookie를 다시 sign. 
+    대부분의 조회 요청은 Redis 쓰기 없이, static과 익명 요청은 Redis 호출 없이 처리됨. 
+    """
+    def __init__(self, app: ASGIApp, session_cookie: str = "session_redis_id", max_age: int = 3600,
+                 refresh_ratio: float = 0.1, exclude_paths: tuple = (),
+                 store: SessionStore = None, codec = None,
+                 identity_cookie: str = None, secret_key: str = None, identity_renew_after: int = 300):
+        self.app = app
         self.session_cookie = session_cookie
         self.max_age = max_age
+        self.refresh_ratio = refresh_ratio
+        self.exclude_paths = tuple(exclude_paths)
+        self.codec = codec or MsgpackSessionCodec()
+        # asyncio Redis client를 await로 호출하여 Redis 응답을 기다리는 동안 event loop가 block 되지 않음.
+        self.store = store or RedisSessionStore(async_redis_client)
+        self.field_level = getattr(self.store, "field_level", False)
+        self.identity_cookie = identity_cookie
+        self.identity_renew_after = identity_renew_after
+        self.identity_signer = IdentitySigner(secret_key, max_age) if identity_cookie else None
 
-    async def dispatch(self, request: Request, call_next):
-        response = None
-        # session_id cookie key로 session_id값을 가져옴. 
-        session_id = request.cookies.get(self.session_cookie)
-        # 신규 session인지 구분. 
-        initial_session_was_empty = True
-        # 만약 cookie에 session_id 값이 있으면
-        if self.max_age is None or self.max_age <= 0:
-            response = await call_next(request)
-            return response
-        try:
-            if session_id:
-                # redis에서 해당 session_id값으로 저장된 개별 session_data를 가져옴
-                session_data = redis_client.get(session_id)
-                # redis에 해당 session_id값으로 데이터가 없을 수도 있음. 만약 있다면
-                if session_data:
-                    # fastapi의 request.state 객체에 새롭게 session 객체를 만들고, 여기에 session data를 저장. 
-                    request.state.session = json.loads(session_data) #dictionary 형태로 바꿈.(utf-8로 알아서 decoding됨.)
-                    redis_client.expire(session_id, self.max_age) #expire를 지정하면 3600초 이후에는 자동으로 redis에서 삭제가 된다.
-                    initial_session_was_empty = False
-                # 만약 없다면, redis에서 여러 이유로 데이터가 삭제되었음. 
-                # request.state.session 객체도 초기화 시키고, 신규 session으로 간주
-                else:
-                    request.state.session = {} #반드시 만들어야함.
-                    #session_id cookie를 가지고 있지 않다면, 이는 신규 session이고, 추후에 response에 set_cookie 호출. 
-                    # new_session = True
-            # cookie에 session_id 값이 없다면. 
-            else:
-                #새로운 session_id값을 uuid로 생성하고 request.state.session값을 초기화.
-                # 신규 session으로 간주.  
-                session_id = str(uuid.uuid4())
-                request.state.session = {}
-                # new_session = True
-
-            response = await call_next(request)
-            if request.state.session:
-                # logging.info("##### request.state.session:" + str(request.state.session))
-                # 초기 접속은 물론, 지속적으로 접속하면 max_age를 계속 갱신. 
-                response.set_cookie(self.session_cookie, session_id, max_age=self.max_age, httponly=True)
-                # redis에서 해당 session_id를 가지는 값을 set 저장. 
-                # request.state.session값의 변경 여부와 관계없이 저장
-                # expiration time을 지속적으로 max_age로 갱신. 
-                redis_client.setex(session_id, self.max_age, json.dumps(request.state.session))
-                
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if (scope["type"] != "http" or self.max_age is None or self.max_age <= 0 
+                or scope["path"].startswith(self.exclude_paths)):
+            await self.app(scope, receive, send)
+            return
+
+        # session_id cookie key로 session_id값을 가져옴. cookie가 없으면 Redis 조회 없이 빈 session.
+        cookies = HTTPConnection(scope).cookies
+        session_id = cookies.get(self.session_cookie)
+        loader = (lambda: self.load_session(session_id)) if session_id else None
+        lazy_session = LazySession(loader, session_id)
+        # request.state는 scope["state"]를 사용함. 
+        scope.setdefault("state", {})["session"] = lazy_session
+
+        identity, identity_cookie_value = None, None
+        if self.identity_signer:
+            identity_cookie_value = cookies.get(self.identity_cookie)
+            identity = await self.load_identity(identity_cookie_value, lazy_session)
+            scope["state"]["identity"] = identity
+
+        async def send_wrapper(message: Message):
+            # response header를 보내기 직전에 session을 저장하고 Set-Cookie를 추가. 
+            # route에서 session을 사용하지 않았으면 저장할 것도 없음. 
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                if identity is not None:
+                    self.save_identity(identity, identity_cookie_value, headers)
+                if lazy_session.loaded:
+                    try:
+                        await self.save_session(lazy_session.session, lazy_session.session_id, 
+                                                lazy_session.refreshed, headers)
+                    except Exception as e:
+                        logging.critical("error in redis session middleware:" + str(e))
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def load_identity(self, cookie_value: str, lazy_session: LazySession) -> Identity:
+        # 서명 확인만 하므로 network I/O 없음. 
+        if not cookie_value:
+            return Identity()
+        identity = self.identity_signer.unsign(cookie_value)
+        if (identity.user is not None 
+                and self.identity_signer.validation_age(identity) >= self.identity_renew_after):
+            # 갱신 주기마다 한번씩 서버 측 session이 아직 유효한지(logout, 강제 만료) 확인. 
+            # 저장소 장애 중(circuit open)에는 확인을 미루고 기존 cookie를 그대로 사용. 
+            if not is_store_writable(self.store, lazy_session.session_id):
+                return identity
+            session = await lazy_session.load()
+            if not is_store_writable(self.store, lazy_session.session_id):
+                return identity
+            if session.get("user_id") == identity.user.get("id"):
+                identity.mark_validated()
             else:
-                # request.state.session가 비어있는데, initial_session_was_empty가 False라는 것은
-                # fastapi API 로직에서 request.state.session이 clear() 호출되어서 삭제되었음을 의미. 
-                # logout이므로 redis에서 해당 session_id 값을 삭제하고, 브라우저의 cookie도 삭제. 
-                if not initial_session_was_empty:
-                    # logging.info("##### redis value before deletion:" + str(redis_client.get(session_id)))
-                    redis_client.delete(session_id)
-                    # logging.info("##### redis value after deletion:" + str(redis_client.get(session_id)))
-                    response.delete_cookie(self.session_cookie)
+                identity.user = None
+        return identity
+
+    def save_identity(self, identity: Identity, cookie_value: str, headers: MutableHeaders):
+        if identity.needs_signing:
+            headers.append("set-cookie", util.cookie_header(self.identity_cookie, 
+                                                            self.identity_signer.sign(identity),
+                                                            max_age=self.max_age))
+        elif identity.user is None and cookie_value:
+            headers.append("set-cookie", util.cookie_header(self.identity_cookie, "", max_age=0))
+
+    async def load_session(self, session_id: str) -> tuple:
+        if self.field_level:
+            return await self.load_session_fields(session_id)
+        try:
+            session_data, refreshed = await self.store.get(session_id, self.max_age, 
+                                                           int(self.max_age * self.refresh_ratio))
         except Exception as e:
             logging.critical("error in redis session middleware:" + str(e))
-        
+            session_data, refreshed = None, False
+
+        # redis에 해당 session_id값으로 데이터가 없다면 신규 session으로 간주. 
+        if session_data:
+            try:
+                return Session(self.codec.decode(session_data), raw=session_data), bool(refreshed)
+            except Exception as e:
+                logging.critical("error in decoding session:" + str(e))
+        return Session(), False
+
+    async def load_session_fields(self, session_id: str) -> tuple:
+        try:
+            fields, refreshed = await self.store.get_fields(session_id, self.max_age, 
+                                                            int(self.max_age * self.refresh_ratio))
+            if fields:
+                data = {key: self.codec.decode(value) for key, value in fields.items()}
+                # raw에 field별 원본 값을 보관해서 저장 시 변경된 field만 찾음. 
+                return Session(data, raw=fields), refreshed
+        except Exception as e:
+            logging.critical("error in redis session middleware:" + str(e))
+        return Session(), False
+
+    async def save_session(self, session: Session, session_id: str, refreshed: bool, 
+                           headers: MutableHeaders):
+        # 저장/삭제 모두 store 호출 한번(Redis는 1 round trip)으로 처리. 
+        if session:
+            if session_id is None:
+                session_id = str(uuid.uuid4())
+            if self.field_level:
+                changed, deleted = session.diff_fields(self.codec.encode)
+                if changed or deleted:
+                    await self.store.set_fields(session_id, changed, deleted, self.max_age)
+                elif not refreshed:
+                    return
+            else:
+                encoded = self.codec.encode(session)
+                if session.is_dirty(encoded):
+                    # 변경된 session만 저장. 저장하면서 TTL도 max_age로 갱신됨. 
+                    await self.store.set(session_id, encoded, self.max_age)
+                elif not refreshed:
+                    return
+            # store의 TTL을 갱신한 경우에만 브라우저 cookie의 max_age도 갱신. 
+            headers.append("set-cookie", util.cookie_header(self.session_cookie, session_id, 
+                                                            max_age=self.max_age))
+        # request.state.session이 비어있는데 기존 session이었다면, 
+        # fastapi API 로직에서 clear() 호출(logout)되었음을 의미. store와 브라우저 cookie 모두 삭제. 
+        elif not session.is_new and session_id:
+            await self.store.delete(session_id)
+            headers.append("set-cookie", util.cookie_header(self.session_cookie, "", max_age=0))
+
+
+class PageCacheMiddleware:
+    """
+    session cookie(와 identity cookie)가 없는 익명 사용자의 GET 요청을 path + query 단위로 캐시. 
+    캐시 hit이면 RedisSessionMiddleware, DB 조회, template rendering 없이 바로 응답. 
+    캐시 miss일 때는 response를 그대로 흘려보내면서(streaming 유지) body를 모아 저장. 
+    반드시 RedisSessionMiddleware보다 나중에 add_middleware 해야 함(바깥쪽에서 수행). 
+    """
+    def __init__(self, app: ASGIApp, page_cache: PageCache,
+                 paths: tuple = (r"^/blogs/$", r"^/blogs/show/\d+$"),
+                 session_cookie: str = "session_redis_id", identity_cookie: str = None):
+        self.app = app
+        self.page_cache = page_cache
+        self.paths = [re.compile(path) for path in paths]
+        # 둘 중 하나라도 있으면 로그인 사용자일 수 있으므로 캐시하지 않음(hybrid session).
+        self.login_cookies = tuple(cookie for cookie in (session_cookie, identity_cookie) if cookie)
+
+    def is_cacheable_request(self, request: HTTPConnection) -> bool:
+        if request.scope["method"] != "GET":
+            return False
+        if any(cookie in request.cookies for cookie in self.login_cookies):
+            return False
+        # cross-origin 요청은 CORS 헤더가 Origin별로 달라지므로 캐시하지 않음.
+        if "origin" in request.headers:
+            return False
+        return any(path.match(request.url.path) for path in self.paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request = HTTPConnection(scope)
+        if not self.is_cacheable_request(request):
+            await self.app(scope, receive, send)
+            return
+
+        key = request.url.path + "?" + request.url.query
+        accept_gzip = "gzip" in request.headers.get("accept-encoding", "")
+        entry = self.page_cache.get(key)
+        if entry is not None:
+            etag = entry["etag"]
+            if etag is not None and util.is_not_modified(request.headers, etag):
+                response = Response(status_code=304, headers={"ETag": etag})
+            else:
+                response = self.cached_response(entry, accept_gzip)
+            await response(scope, receive, send)
+            return
+
+        start_message = None
+        body_parts = []
+
+        async def send_wrapper(message: Message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                if (message["status"] == 200 and "set-cookie" not in headers
+                        and headers.get("content-type", "").startswith("text/html")):
+                    start_message = message
+            elif message["type"] == "http.response.body" and start_message is not None:
+                body_parts.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    headers = [(k, v) for k, v in start_message["headers"] 
+                               if k.lower() != b"content-length"]
+                    self.page_cache.set(key, start_message["status"], headers, b"".join(body_parts))
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    def cached_response(self, entry: dict, accept_gzip: bool) -> Response:
+        # 브라우저가 gzip을 받을 수 있으면 압축된 body를 그대로 전송.
+        if accept_gzip:
+            body = entry["gzip_body"]
+            extra_headers = [(b"content-encoding", b"gzip")]
+        else:
+            body = gzip.decompress(entry["gzip_body"])
+            extra_headers = []
+        response = Response(content=body, status_code=entry["status_code"])
+        response.raw_headers = entry["headers"] + extra_headers + [
+            (b"vary", b"Accept-Encoding"),
+            (b"x-page-cache", b"HIT"),
+            (b"content-length", str(len(body)).encode("latin-1"))]
         return response
-                
-        
\ No newline at end of file
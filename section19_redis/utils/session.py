@@ -0,0 +1,135 @@
+import uuid
+
+class Session(dict):
+    """
+    request.state.session으로 사용하는 dictionary. 
+    값이 변경되었는지 추적해서 변경된 session만 Redis에 다시 저장할 수 있도록 함. 
+    session_user['lastviewed_blog_id'] = ... 처럼 내부 dictionary를 직접 바꾸는 경우는
+    추적이 안되므로 is_dirty()에서 저장 시점의 직렬화 값과 load 시점의 값을 비교. 
+    (기존 형식으로 저장된 session은 값이 같아도 dirty로 판단되어 새 형식으로 다시 저장됨)
+    """
+    def __init__(self, data: dict = None, raw: bytes = None):
+        super().__init__(data or {})
+        # store에서 읽어온 원본 값. 신규 session이면 None
+        self.raw = raw
+        self.modified = False
+
+    @property
+    def is_new(self) -> bool:
+        return self.raw is None
+
+    def is_dirty(self, encoded: bytes) -> bool:
+        return self.modified or encoded != self.raw
+
+    def diff_fields(self, encode) -> tuple[dict, list]:
+        # field 단위 저장용. raw는 load 시점의 {key: 직렬화 값}. 
+        # 값이 달라진 key와 삭제된 key만 반환. 
+        original = self.raw if isinstance(self.raw, dict) else {}
+        changed = {}
+        for key, value in self.items():
+            encoded = encode(value)
+            if original.get(key) != encoded:
+                changed[key] = encoded
+        deleted = [key for key in original if key not in self]
+        return changed, deleted
+
+    def __setitem__(self, key, value):
+        self.modified = True
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self.modified = True
+        super().__delitem__(key)
+
+    def clear(self):
+        self.modified = True
+        super().clear()
+
+    def pop(self, *args):
+        self.modified = True
+        return super().pop(*args)
+
+    def popitem(self):
+        self.modified = True
+        return super().popitem()
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self.modified = True
+        return super().setdefault(key, default)
+
+    def update(self, *args, **kwargs):
+        self.modified = True
+        super().update(*args, **kwargs)
+
+
+class LazySession:
+    """
+    실제 session은 route에서 처음 load() 할 때 store(Redis)에서 가져옴. 
+    session을 사용하지 않는 요청은 Redis를 전혀 호출하지 않음. 
+    load() 이전에 값을 읽거나 쓰면 RuntimeError. (clear()는 load 없이도 가능)
+    """
+    def __init__(self, loader=None, session_id: str = None):
+        # loader: Session과 TTL 갱신 여부를 반환하는 async 함수. cookie가 없으면 None
+        self._loader = loader
+        # cookie의 session_id. 신규 session이면 저장 시점(또는 ensure_session_id() 호출 시)에 생성. 
+        self.session_id = session_id
+        self._session: Session | None = None
+        self.refreshed = False
+
+    @property
+    def loaded(self) -> bool:
+        return self._session is not None
+
+    @property
+    def session(self) -> Session:
+        if self._session is None:
+            raise RuntimeError("session has not been loaded. await request.state.session.load() first")
+        return self._session
+
+    async def load(self) -> Session:
+        if self._session is None:
+            if self._loader is None:
+                self._session = Session()
+            else:
+                self._session, self.refreshed = await self._loader()
+        return self._session
+
+    def ensure_session_id(self) -> str:
+        # login처럼 응답 전에 session_id가 필요한 경우 사용(user별 session 목록에 등록). 
+        if self.session_id is None:
+            self.session_id = str(uuid.uuid4())
+        return self.session_id
+
+    def clear(self):
+        # logout은 기존 값을 읽을 필요가 없으므로 load 없이 삭제 대상으로 표시. 
+        if self._session is None:
+            self._session = Session(raw=b"")
+        self._session.clear()
+
+    def __getitem__(self, key):
+        return self.session[key]
+
+    def __setitem__(self, key, value):
+        self.session[key] = value
+
+    def __delitem__(self, key):
+        del self.session[key]
+
+    def __contains__(self, key):
+        return key in self.session
+
+    def __iter__(self):
+        return iter(self.session)
+
+    def __len__(self):
+        return len(self.session)
+
+    def __bool__(self):
+        return bool(self.session)
+
+    def __getattr__(self, name):
+        # keys(), get(), pop() 등 나머지 dict 메소드는 Session에 위임. 
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.session, name)
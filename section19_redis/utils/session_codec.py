@@ -0,0 +1,45 @@
+import json
+import zlib
+import msgpack
+
+# 저장 형식 구분용 첫 byte. 
+# 기존(JSON) session은 '{'로 시작하므로 version byte 없이도 구분 가능. 
+VERSION_MSGPACK = 1
+VERSION_MSGPACK_ZLIB = 2
+LEGACY_JSON_PREFIX = ord("{")
+
+class JsonSessionCodec:
+    """기존 방식. json 문자열을 그대로 저장."""
+    def encode(self, data: dict) -> bytes:
+        return json.dumps(data).encode("utf-8")
+
+    def decode(self, raw: bytes) -> dict:
+        return json.loads(raw)
+
+
+class MsgpackSessionCodec:
+    """
+    [version byte] + msgpack으로 저장. compress_threshold byte보다 크면 zlib으로 압축. 
+    version byte가 없는 기존 JSON session도 읽을 수 있으며, 
+    값이 변경되어 다시 저장될 때 msgpack 형식으로 바뀜. 
+    """
+    def __init__(self, compress_threshold: int = 1024, compress_level: int = 6):
+        self.compress_threshold = compress_threshold
+        self.compress_level = compress_level
+
+    # field 단위 저장(RedisHashSessionStore)에서는 dict가 아닌 개별 값도 encode/decode 함. 
+    def encode(self, data: dict) -> bytes:
+        packed = msgpack.packb(data, use_bin_type=True)
+        if len(packed) > self.compress_threshold:
+            return bytes([VERSION_MSGPACK_ZLIB]) + zlib.compress(packed, self.compress_level)
+        return bytes([VERSION_MSGPACK]) + packed
+
+    def decode(self, raw: bytes) -> dict:
+        version = raw[0]
+        if version == VERSION_MSGPACK:
+            return msgpack.unpackb(raw[1:], raw=False)
+        if version == VERSION_MSGPACK_ZLIB:
+            return msgpack.unpackb(zlib.decompress(raw[1:]), raw=False)
+        if version == LEGACY_JSON_PREFIX:
+            return json.loads(raw)
+        raise ValueError(f"unknown session format version: {version}")
@@ -0,0 +1,660 @@
+from typing import Protocol
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from utils.cache import LocalTTLCache
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+import redis.asyncio as aioredis
+import asyncio
+import bisect
+import hashlib
+import logging
+import time
+import os
+
+class SessionStore(Protocol):
+    """
+    RedisSessionMiddleware가 사용하는 session 저장소. data는 codec으로 직렬화된 bytes. 
+    get()은 값을 가져오면서 만료까지 남은 시간이 ttl - refresh_after 이하이면 ttl로 연장하고,
+    (값, 연장 여부)를 반환. 값이 없으면 (None, False). 
+    user별 session id 목록(login/logout 시 갱신)을 관리하여 사용자의 모든 session을 
+    keyspace 전체 조회 없이 O(해당 사용자의 session 수)로 만료시킴. 
+    만료된 session id는 목록 조회(get_user_sessions)나 login 시 정리. 
+    """
+    async def get(self, session_id: str, ttl: int, refresh_after: int = 0) -> tuple[bytes | None, bool]: ...
+
+    async def set(self, session_id: str, data: bytes, ttl: int): ...
+
+    async def touch(self, session_id: str, ttl: int): ...
+
+    async def delete(self, session_id: str): ...
+
+    async def add_user_session(self, user_id: int, session_id: str): ...
+
+    async def remove_user_session(self, user_id: int, session_id: str): ...
+
+    async def get_user_sessions(self, user_id: int) -> list: ...
+
+    async def revoke_user_sessions(self, user_id: int) -> int: ...
+
+
+# session 값을 가져오면서, max_age - TTL이 refresh 기준(ARGV[2]) 이상이면 TTL도 갱신. 
+# GET/TTL/EXPIRE를 하나의 atomic한 명령으로 수행(1 round trip). 
+LOAD_SESSION_SCRIPT = """
+local value = redis.call('GET', KEYS[1])
+if not value then
+    return {false, 0}
+end
+local ttl = redis.call('TTL', KEYS[1])
+if ttl < 0 or tonumber(ARGV[1]) - ttl >= tonumber(ARGV[2]) then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+    return {value, 1}
+end
+return {value, 0}
+"""
+
+# user_sessions:{user_id} set에서 session key(ARGV[1] + session_id)가 없는(만료된) id를 제거하고 
+# 남은 id 목록을 반환. ARGV[2]가 있으면 먼저 추가(login). 
+USER_SESSIONS_SCRIPT = """
+if ARGV[2] and ARGV[2] ~= '' then
+    redis.call('SADD', KEYS[1], ARGV[2])
+end
+local alive = {}
+for _, session_id in ipairs(redis.call('SMEMBERS', KEYS[1])) do
+    if redis.call('EXISTS', ARGV[1] .. session_id) == 1 then
+        table.insert(alive, session_id)
+    else
+        redis.call('SREM', KEYS[1], session_id)
+    end
+end
+return alive
+"""
+
+# user의 모든 session key와 user_sessions set을 삭제하고 삭제한 session 건수를 반환.
+REVOKE_USER_SESSIONS_SCRIPT = """
+local count = 0
+for _, session_id in ipairs(redis.call('SMEMBERS', KEYS[1])) do
+    count = count + redis.call('DEL', ARGV[1] .. session_id)
+end
+redis.call('DEL', KEYS[1])
+return count
+"""
+
+class RedisSessionStore:
+    def __init__(self, redis_client: aioredis.Redis, key_prefix: str = ""):
+        self.redis_client = redis_client
+        self.key_prefix = key_prefix
+        self.load_script = redis_client.register_script(LOAD_SESSION_SCRIPT)
+        self.user_sessions_script = redis_client.register_script(USER_SESSIONS_SCRIPT)
+        self.revoke_script = redis_client.register_script(REVOKE_USER_SESSIONS_SCRIPT)
+
+    def _key(self, session_id: str) -> str:
+        return self.key_prefix + session_id
+
+    def _user_key(self, user_id: int) -> str:
+        return f"{self.key_prefix}user_sessions:{user_id}"
+
+    async def get(self, session_id: str, ttl: int, refresh_after: int = 0) -> tuple[bytes | None, bool]:
+        if refresh_after <= 0:
+            # 매 요청마다 TTL 갱신. GETEX는 Redis 6.2 이상에서 지원. 
+            data = await self.redis_client.getex(self._key(session_id), ex=ttl)
+            return data, data is not None
+        data, refreshed = await self.load_script(keys=[self._key(session_id)], 
+                                                 args=[ttl, refresh_after])
+        return data, bool(refreshed)
+
+    async def set(self, session_id: str, data: bytes, ttl: int):
+        await self.redis_client.setex(self._key(session_id), ttl, data)
+
+    async def touch(self, session_id: str, ttl: int):
+        await self.redis_client.expire(self._key(session_id), ttl)
+
+    async def delete(self, session_id: str):
+        await self.redis_client.delete(self._key(session_id))
+
+    async def exists(self, session_id: str) -> bool:
+        return await self.redis_client.exists(self._key(session_id)) > 0
+
+    async def add_user_session(self, user_id: int, session_id: str):
+        # 추가하면서 만료된 id도 정리하므로 자주 login 하는 사용자도 set이 계속 커지지 않음. 
+        await self.user_sessions_script(keys=[self._user_key(user_id)], 
+                                        args=[self.key_prefix, session_id])
+
+    async def remove_user_session(self, user_id: int, session_id: str):
+        await self.redis_client.srem(self._user_key(user_id), session_id)
+
+    async def get_user_sessions(self, user_id: int) -> list:
+        session_ids = await self.user_sessions_script(keys=[self._user_key(user_id)], 
+                                                      args=[self.key_prefix, ""])
+        return [session_id.decode("utf-8") for session_id in session_ids]
+
+    async def revoke_user_sessions(self, user_id: int) -> int:
+        return await self.revoke_script(keys=[self._user_key(user_id)], args=[self.key_prefix])
+
+
+# hash 전체를 가져오면서 TTL 갱신. LOAD_SESSION_SCRIPT의 hash 버전. 
+LOAD_SESSION_HASH_SCRIPT = """
+local fields = redis.call('HGETALL', KEYS[1])
+if #fields == 0 then
+    return {fields, 0}
+end
+local ttl = redis.call('TTL', KEYS[1])
+if ttl < 0 or tonumber(ARGV[1]) - ttl >= tonumber(ARGV[2]) then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+    return {fields, 1}
+end
+return {fields, 0}
+"""
+
+class RedisHashSessionStore(RedisSessionStore):
+    """
+    session 하나를 Redis hash 하나로 저장하고, session의 최상위 key를 hash field로 저장. 
+    변경된 field만 HSET/HDEL 하므로 쓰기 크기가 작고, 
+    같은 session을 사용하는 동시 요청이 서로 다른 key를 변경해도 덮어쓰지 않음. 
+    """
+    field_level = True
+
+    def __init__(self, redis_client: aioredis.Redis, key_prefix: str = ""):
+        super().__init__(redis_client, key_prefix)
+        self.load_hash_script = redis_client.register_script(LOAD_SESSION_HASH_SCRIPT)
+
+    async def get_fields(self, session_id: str, ttl: int, 
+                         refresh_after: int = 0) -> tuple[dict | None, bool]:
+        flat_fields, refreshed = await self.load_hash_script(keys=[self._key(session_id)], 
+                                                             args=[ttl, refresh_after])
+        if not flat_fields:
+            return None, False
+        # HGETALL 결과는 [field1, value1, field2, value2, ...]
+        fields = {flat_fields[i].decode("utf-8"): flat_fields[i + 1] 
+                  for i in range(0, len(flat_fields), 2)}
+        return fields, bool(refreshed)
+
+    async def set_fields(self, session_id: str, changed: dict, deleted: list, ttl: int):
+        # HSET/HDEL과 EXPIRE를 MULTI/EXEC로 묶어서 한번에 수행. 
+        key = self._key(session_id)
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            if changed:
+                pipe.hset(key, mapping=changed)
+            if deleted:
+                pipe.hdel(key, *deleted)
+            pipe.expire(key, ttl)
+            await pipe.execute()
+
+
+class HashRing:
+    """
+    consistent hash ring. node마다 vnodes개의 가상 node를 ring에 배치해서 key를 고르게 분산. 
+    node를 추가/삭제하면 전체 key 중 약 1/N만 다른 node로 이동. 
+    """
+    def __init__(self, nodes: list = (), vnodes: int = 160):
+        self.vnodes = vnodes
+        self._hashes: list = []
+        self._nodes: dict = {}
+        for node in nodes:
+            self.add_node(node)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+    def add_node(self, node: str):
+        for i in range(self.vnodes):
+            h = self._hash(f"{node}#{i}")
+            if h not in self._nodes:
+                bisect.insort(self._hashes, h)
+                self._nodes[h] = node
+
+    def remove_node(self, node: str):
+        for i in range(self.vnodes):
+            h = self._hash(f"{node}#{i}")
+            if self._nodes.get(h) == node:
+                del self._nodes[h]
+                self._hashes.remove(h)
+
+    def get_node(self, key: str) -> str:
+        if not self._hashes:
+            raise ValueError("hash ring is empty")
+        # key의 hash 값보다 크거나 같은 첫번째 가상 node. 없으면 ring의 처음으로 돌아감. 
+        index = bisect.bisect(self._hashes, self._hash(key)) % len(self._hashes)
+        return self._nodes[self._hashes[index]]
+
+
+class ShardedRedisSessionStore:
+    """
+    여러 Redis node에 session을 consistent hash로 나눠서 저장. 
+    node별 명령 수, latency, 오류 수를 기록하고 key_counts()로 node별 key 건수를 조회. 
+    clients에 fakeredis 등 임의의 asyncio Redis client를 넣어서 테스트 가능. 
+    """
+    def __init__(self, clients: dict, vnodes: int = 160, key_prefix: str = "",
+                 circuit_breaker: bool = False):
+        self.ring = HashRing(vnodes=vnodes)
+        self.stores: dict = {}
+        self.key_prefix = key_prefix
+        # node별 circuit breaker. 장애 node에 있는 session만 읽기 전용이 되고 나머지 node는 정상 처리. 
+        self.circuit_breaker = circuit_breaker
+        self.stats: dict = {}
+        for name, client in clients.items():
+            self.add_node(name, client)
+
+    @classmethod
+    def from_urls(cls, urls: list, **kwargs):
+        # 예: ["redis://10.0.0.1:6379/0", "redis://10.0.0.2:6379/0"]. url을 node 이름으로 사용.
+        from db.redis_db import create_redis_client
+        return cls({url: create_redis_client(url) for url in urls}, **kwargs)
+
+    def add_node(self, name: str, client: aioredis.Redis):
+        store = RedisSessionStore(client, key_prefix=self.key_prefix)
+        if self.circuit_breaker:
+            store = CircuitBreakerSessionStore(store, CircuitBreaker(f"session_store:{name}"))
+        self.stores[name] = store
+        self.stats[name] = {"commands": 0, "errors": 0, "latency_seconds_total": 0.0,
+                            "latency_seconds_max": 0.0}
+        self.ring.add_node(name)
+
+    def remove_node(self, name: str):
+        self.ring.remove_node(name)
+        self.stores.pop(name, None)
+
+    async def _call(self, session_id: str, method: str, *args):
+        node = self.ring.get_node(session_id)
+        return await self._call_node(node, getattr(self.stores[node], method), session_id, *args)
+
+    async def _redis_call(self, node: str, command: str, *args):
+        # node의 Redis 명령을 직접 수행. circuit breaker가 있으면 breaker를 거쳐서 호출하므로 
+        # circuit이 open이면 무시하지 않고 CircuitOpenError 발생. 
+        store = self.stores[node]
+        func = getattr(store.redis_client, command)
+        breaker = getattr(store, "breaker", None)
+        if breaker is not None:
+            return await self._call_node(node, breaker.call, func, *args)
+        return await self._call_node(node, func, *args)
+
+    async def _call_node(self, node: str, func, *args):
+        stats = self.stats[node]
+        start = time.perf_counter()
+        try:
+            return await func(*args)
+        except Exception:
+            stats["errors"] += 1
+            raise
+        finally:
+            latency = time.perf_counter() - start
+            stats["commands"] += 1
+            stats["latency_seconds_total"] += latency
+            stats["latency_seconds_max"] = max(stats["latency_seconds_max"], latency)
+
+    async def get(self, session_id: str, ttl: int, refresh_after: int = 0) -> tuple[bytes | None, bool]:
+        return await self._call(session_id, "get", ttl, refresh_after)
+
+    async def set(self, session_id: str, data: bytes, ttl: int):
+        await self._call(session_id, "set", data, ttl)
+
+    async def touch(self, session_id: str, ttl: int):
+        await self._call(session_id, "touch", ttl)
+
+    async def delete(self, session_id: str):
+        await self._call(session_id, "delete")
+
+    def is_writable(self, session_id: str = None) -> bool:
+        if session_id is None or not self.stores:
+            return True
+        store = self.stores[self.ring.get_node(session_id)]
+        return getattr(store, "is_writable", lambda session_id: True)(session_id)
+
+    def get_breakers(self) -> dict:
+        return {name: store.breaker for name, store in self.stores.items() if hasattr(store, "breaker")}
+
+    def _user_node(self, user_id: int) -> str:
+        # user_sessions set은 session과 다른 node에 있을 수 있으므로 
+        # 만료 확인/삭제는 session id별로 해당 node에 요청. 
+        return self.ring.get_node(f"user_sessions:{user_id}")
+
+    async def _user_session_ids(self, node: str, key: str) -> list:
+        return [session_id.decode("utf-8") for session_id in await self._redis_call(node, "smembers", key)]
+
+    async def add_user_session(self, user_id: int, session_id: str):
+        node = self._user_node(user_id)
+        await self._redis_call(node, "sadd", self.stores[node]._user_key(user_id), session_id)
+        await self.get_user_sessions(user_id)
+
+    async def remove_user_session(self, user_id: int, session_id: str):
+        await self.stores[self._user_node(user_id)].remove_user_session(user_id, session_id)
+
+    async def get_user_sessions(self, user_id: int) -> list:
+        node = self._user_node(user_id)
+        key = self.stores[node]._user_key(user_id)
+        session_ids = await self._user_session_ids(node, key)
+        exists = await asyncio.gather(*(self._call(session_id, "exists") for session_id in session_ids))
+        expired = [session_id for session_id, alive in zip(session_ids, exists) if not alive]
+        if expired:
+            await self._redis_call(node, "srem", key, *expired)
+        return [session_id for session_id, alive in zip(session_ids, exists) if alive]
+
+    async def _revoke_session(self, session_id: str) -> int:
+        # delete()와 달리 circuit이 open이어도 무시하지 않고 오류 발생. 삭제한 key 수를 반환. 
+        node = self.ring.get_node(session_id)
+        store = self.stores[node]
+        if hasattr(store, "local"):
+            store.local.delete(session_id)
+        return await self._redis_call(node, "delete", store._key(session_id))
+
+    async def revoke_user_sessions(self, user_id: int) -> int:
+        node = self._user_node(user_id)
+        key = self.stores[node]._user_key(user_id)
+        session_ids = await self._user_session_ids(node, key)
+        results = await asyncio.gather(*(self._revoke_session(session_id) for session_id in session_ids), 
+                                       return_exceptions=True)
+        # 삭제한 id만 목록에서 제거. 삭제하지 못한 id는 남겨 두어 다시 요청할 수 있게 함. 
+        revoked = [session_id for session_id, result in zip(session_ids, results) 
+                   if not isinstance(result, BaseException)]
+        if revoked:
+            await self._redis_call(node, "srem", key, *revoked)
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            raise errors[0]
+        return sum(results)
+
+    async def key_counts(self) -> dict:
+        # node별 DBSIZE. session 전용 db를 사용해야 session 건수와 일치. 
+        counts = {}
+        for name, store in self.stores.items():
+            try:
+                counts[name] = await store.redis_client.dbsize()
+            except Exception:
+                counts[name] = None
+        return counts
+
+    def get_stats(self) -> dict:
+        return self.stats
+
+
+class CircuitBreakerSessionStore:
+    """
+    session 저장소를 circuit breaker로 감쌈. Redis 장애 시 매 요청이 socket timeout까지 기다리지 않고 바로 실패. 
+    - circuit이 open이면 최근에 읽은 session을 local 캐시(cache_ttl초)에서 읽기 전용으로 제공. 
+      캐시에 없으면 session이 없는 것으로(익명) 처리. 
+    - open 상태의 쓰기(set/touch/delete)는 저장하지 않고 무시. 
+    - is_writable()이 False이면 login 등 session 쓰기가 필요한 기능은 사용하지 않아야 함. 
+    """
+    def __init__(self, store: SessionStore, breaker: CircuitBreaker = None, 
+                 cache_ttl: int = 30, cache_maxsize: int = 10000):
+        self.store = store
+        self.breaker = breaker or CircuitBreaker("session_store")
+        self.field_level = getattr(store, "field_level", False)
+        self.cache_ttl = cache_ttl
+        self.local = LocalTTLCache(maxsize=cache_maxsize)
+
+    def is_writable(self, session_id: str = None) -> bool:
+        # 지금 저장소를 호출할 수 있는지(closed, 또는 half_open에서 시험 호출 가능). 
+        return self.breaker.allows_calls
+
+    async def _read(self, method: str, session_id: str, *args) -> tuple:
+        try:
+            data, refreshed = await self.breaker.call(getattr(self.store, method), session_id, *args)
+        except Exception as e:
+            logging.info(f"session store unavailable, read from local cache: {e}")
+            return self.local.get(session_id), False
+        if data is None:
+            self.local.delete(session_id)
+        else:
+            self.local.set(session_id, data, time.time() + self.cache_ttl)
+        return data, refreshed
+
+    async def _write(self, method: str, *args) -> bool:
+        try:
+            await self.breaker.call(getattr(self.store, method), *args)
+            return True
+        except CircuitOpenError as e:
+            # 읽기 전용 상태. 변경 내용은 저장하지 않음. 
+            logging.critical(f"session {method} skipped: {e}")
+            return False
+
+    async def get(self, session_id: str, ttl: int, refresh_after: int = 0) -> tuple[bytes | None, bool]:
+        return await self._read("get", session_id, ttl, refresh_after)
+
+    async def get_fields(self, session_id: str, ttl: int, 
+                         refresh_after: int = 0) -> tuple[dict | None, bool]:
+        return await self._read("get_fields", session_id, ttl, refresh_after)
+
+    async def set(self, session_id: str, data: bytes, ttl: int):
+        if await self._write("set", session_id, data, ttl):
+            self.local.set(session_id, data, time.time() + self.cache_ttl)
+
+    async def set_fields(self, session_id: str, changed: dict, deleted: list, ttl: int):
+        if await self._write("set_fields", session_id, changed, deleted, ttl):
+            self.local.delete(session_id)
+
+    async def touch(self, session_id: str, ttl: int):
+        await self._write("touch", session_id, ttl)
+
+    async def delete(self, session_id: str):
+        # 장애 중이라도 logout한 session은 local 캐시에서 바로 제거. 
+        self.local.delete(session_id)
+        await self._write("delete", session_id)
+
+    async def exists(self, session_id: str) -> bool:
+        return await self.breaker.call(self.store.exists, session_id)
+
+    async def add_user_session(self, user_id: int, session_id: str):
+        await self._write("add_user_session", user_id, session_id)
+
+    async def remove_user_session(self, user_id: int, session_id: str):
+        await self._write("remove_user_session", user_id, session_id)
+
+    async def get_user_sessions(self, user_id: int) -> list:
+        return await self.breaker.call(self.store.get_user_sessions, user_id)
+
+    async def revoke_user_sessions(self, user_id: int) -> int:
+        return await self.breaker.call(self.store.revoke_user_sessions, user_id)
+
+    def __getattr__(self, name):
+        # key_counts(), get_stats() 등 저장소별 메소드는 그대로 위임.
+        if name == "store":
+            raise AttributeError(name)
+        return getattr(self.store, name)
+
+
+class MemorySessionStore:
+    """
+    프로세스 내부 dictionary 저장소. Redis 없이 단일 worker로 수행하거나 테스트할 때 사용. 
+    worker 간에 session이 공유되지 않으므로 worker가 여러개인 운영 환경에서는 사용 불가. 
+    """
+    def __init__(self, sweep_interval: int = 1000):
+        # session_id -> (data, expires_at)
+        self._data: dict = {}
+        # user_id -> session_id set
+        self._user_sessions: dict = {}
+        self.sweep_interval = sweep_interval
+        self._set_count = 0
+
+    async def get(self, session_id: str, ttl: int, refresh_after: int = 0) -> tuple[bytes | None, bool]:
+        entry = self._data.get(session_id)
+        if entry is None:
+            return None, False
+        data, expires_at = entry
+        now = time.time()
+        if expires_at <= now:
+            del self._data[session_id]
+            return None, False
+        if ttl - (expires_at - now) >= refresh_after:
+            self._data[session_id] = (data, now + ttl)
+            return data, True
+        return data, False
+
+    async def set(self, session_id: str, data: bytes, ttl: int):
+        self._data[session_id] = (data, time.time() + ttl)
+        self._set_count += 1
+        # 만료된 session은 일정 횟수의 저장마다 한번씩 정리. 
+        if self._set_count % self.sweep_interval == 0:
+            self.sweep()
+
+    async def touch(self, session_id: str, ttl: int):
+        entry = self._data.get(session_id)
+        if entry is not None:
+            self._data[session_id] = (entry[0], time.time() + ttl)
+
+    async def delete(self, session_id: str):
+        self._data.pop(session_id, None)
+
+    async def add_user_session(self, user_id: int, session_id: str):
+        self._user_sessions.setdefault(user_id, set()).add(session_id)
+        await self.get_user_sessions(user_id)
+
+    async def remove_user_session(self, user_id: int, session_id: str):
+        self._user_sessions.get(user_id, set()).discard(session_id)
+
+    async def get_user_sessions(self, user_id: int) -> list:
+        session_ids = self._user_sessions.get(user_id)
+        if not session_ids:
+            return []
+        now = time.time()
+        alive = {session_id for session_id in session_ids 
+                 if session_id in self._data and self._data[session_id][1] > now}
+        self._user_sessions[user_id] = alive
+        return list(alive)
+
+    async def revoke_user_sessions(self, user_id: int) -> int:
+        session_ids = self._user_sessions.pop(user_id, set())
+        return sum(1 for session_id in session_ids if self._data.pop(session_id, None) is not None)
+
+    def sweep(self):
+        now = time.time()
+        expired = [session_id for session_id, (_, expires_at) in self._data.items() if expires_at <= now]
+        for session_id in expired:
+            del self._data[session_id]
+
+
+class SQLSessionStore:
+    """
+    RDBMS(MySQL, SQLite) 테이블 저장소. initial_blog_user.sql의 session 테이블을 사용. 
+    만료 시각은 DB 종류와 관계없이 비교할 수 있도록 epoch 초로 저장. 
+    만료된 row는 delete_expired()로 정리. user별 session 목록은 user_session 테이블 사용. 
+    """
+    def __init__(self, engine: AsyncEngine, table: str = "session", user_table: str = "user_session"):
+        self.engine = engine
+        self.table = table
+        self.user_table = user_table
+
+    async def get(self, session_id: str, ttl: int, refresh_after: int = 0) -> tuple[bytes | None, bool]:
+        now = int(time.time())
+        async with self.engine.begin() as conn:
+            query = f"""
+            SELECT data, expires_at from {self.table}
+            where id = :id and expires_at > :now
+            """
+            result = await conn.execute(text(query).bindparams(id=session_id, now=now))
+            row = result.fetchone()
+            result.close()
+            if row is None:
+                return None, False
+            if ttl - (row.expires_at - now) < refresh_after:
+                return row.data, False
+            update_query = f"""
+            UPDATE {self.table} SET expires_at = :expires_at
+            where id = :id
+            """
+            await conn.execute(text(update_query).bindparams(id=session_id, expires_at=now + ttl))
+            return row.data, True
+
+    async def set(self, session_id: str, data: bytes, ttl: int):
+        if self.engine.dialect.name == "mysql":
+            upsert = "ON DUPLICATE KEY UPDATE data = VALUES(data), expires_at = VALUES(expires_at)"
+        else:
+            upsert = "ON CONFLICT(id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at"
+        query = f"""
+        INSERT INTO {self.table}(id, data, expires_at)
+        values (:id, :data, :expires_at)
+        {upsert}
+        """
+        async with self.engine.begin() as conn:
+            await conn.execute(text(query).bindparams(id=session_id, data=data, 
+                                                      expires_at=int(time.time()) + ttl))
+
+    async def touch(self, session_id: str, ttl: int):
+        query = f"""
+        UPDATE {self.table} SET expires_at = :expires_at
+        where id = :id
+        """
+        async with self.engine.begin() as conn:
+            await conn.execute(text(query).bindparams(id=session_id, expires_at=int(time.time()) + ttl))
+
+    async def delete(self, session_id: str):
+        async with self.engine.begin() as conn:
+            await conn.execute(text(f"DELETE FROM {self.table} where id = :id").bindparams(id=session_id))
+
+    async def add_user_session(self, user_id: int, session_id: str):
+        ignore = "INSERT IGNORE" if self.engine.dialect.name == "mysql" else "INSERT OR IGNORE"
+        query = f"""
+        {ignore} INTO {self.user_table}(user_id, session_id)
+        values (:user_id, :session_id)
+        """
+        async with self.engine.begin() as conn:
+            await conn.execute(text(query).bindparams(user_id=user_id, session_id=session_id))
+        await self.get_user_sessions(user_id)
+
+    async def remove_user_session(self, user_id: int, session_id: str):
+        query = f"""
+        DELETE FROM {self.user_table}
+        where user_id = :user_id and session_id = :session_id
+        """
+        async with self.engine.begin() as conn:
+            await conn.execute(text(query).bindparams(user_id=user_id, session_id=session_id))
+
+    async def get_user_sessions(self, user_id: int) -> list:
+        prune_query = f"""
+        DELETE FROM {self.user_table}
+        where user_id = :user_id 
+        and session_id not in (SELECT id from {self.table} where expires_at > :now)
+        """
+        select_query = f"""
+        SELECT session_id from {self.user_table}
+        where user_id = :user_id
+        """
+        async with self.engine.begin() as conn:
+            await conn.execute(text(prune_query).bindparams(user_id=user_id, now=int(time.time())))
+            result = await conn.execute(text(select_query).bindparams(user_id=user_id))
+            session_ids = [row.session_id for row in result.fetchall()]
+            result.close()
+            return session_ids
+
+    async def revoke_user_sessions(self, user_id: int) -> int:
+        delete_query = f"""
+        DELETE FROM {self.table}
+        where id in (SELECT session_id from {self.user_table} where user_id = :user_id)
+        """
+        async with self.engine.begin() as conn:
+            result = await conn.execute(text(delete_query).bindparams(user_id=user_id))
+            await conn.execute(text(f"DELETE FROM {self.user_table} where user_id = :user_id")
+                               .bindparams(user_id=user_id))
+            return result.rowcount
+
+    async def delete_expired(self):
+        async with self.engine.begin() as conn:
+            await conn.execute(text(f"DELETE FROM {self.table} where expires_at <= :now")
+                               .bindparams(now=int(time.time())))
+
+
+def is_store_writable(store: SessionStore, session_id: str = None) -> bool:
+    # circuit breaker가 없는 저장소는 항상 쓰기 가능으로 간주. 
+    is_writable = getattr(store, "is_writable", None)
+    return is_writable(session_id) if is_writable else True
+
+
+def create_session_store(store_type: str = "redis") -> SessionStore:
+    # SESSION_STORE 환경변수(redis, redis_hash, redis_sharded, memory, sql)로 main.py에서 저장소 선택. 
+    # Redis 저장소는 장애 시 바로 실패하도록 circuit breaker로 감쌈. 
+    if store_type == "redis":
+        from db.redis_db import async_redis_client
+        return CircuitBreakerSessionStore(RedisSessionStore(async_redis_client))
+    if store_type == "redis_hash":
+        from db.redis_db import async_redis_client
+        return CircuitBreakerSessionStore(RedisHashSessionStore(async_redis_client))
+    if store_type == "redis_sharded":
+        # SESSION_REDIS_URLS: 콤마로 구분한 Redis node url 목록
+        urls = [url.strip() for url in os.getenv("SESSION_REDIS_URLS", "").split(",") if url.strip()]
+        return ShardedRedisSessionStore.from_urls(urls, circuit_breaker=True)
+    if store_type == "memory":
+        return MemorySessionStore()
+    if store_type == "sql":
+        from db.database import engine
+        return SQLSessionStore(engine)
+    raise ValueError(f"unknown session store type: {store_type}")
@@ -1,3 +1,9 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+import base64
+import hashlib
+import html
+
 def truncate_text(text, limit=150) -> str:
     if text is not None:
         if len(text) > limit:
@@ -12,6 +18,12 @@ def newline_to_br(text_newline: str) -> str:
         return text_newline.replace('\n', '<br>')
     return None
 
+# 상세 화면용 본문. html escape 후 줄바꿈을 <br>로 변환하므로 template에서 | safe로 출력해도 안전.
+def content_to_html(content: str) -> str:
+    if content is not None:
+        return newline_to_br(html.escape(content))
+    return None
+
 def none_to_null(text, is_squote=False):
     if text is None:
         return "Null"
@@ -20,3 +32,73 @@ def none_to_null(text, is_squote=False):
             return f"'{text}'"
         else:
             return text
+
+# keyset pagination용 cursor. (modified_dt, id)를 url에 넣을 수 있는 문자열로 변환.
+def encode_cursor(modified_dt: datetime, id: int) -> str:
+    raw = f"{modified_dt.isoformat()}|{id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+# 잘못된 cursor 값이면 ValueError를 던진다.
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        modified_dt, id = raw.split("|")
+        return datetime.fromisoformat(modified_dt), int(id)
+    except Exception as e:
+        raise ValueError(f"invalid cursor: {cursor}") from e
+
+# Conditional GET용 strong ETag. parts가 하나라도 바뀌면 다른 값이 됨.
+def make_etag(*parts) -> str:
+    raw = "|".join(str(part) for part in parts)
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest() + '"'
+
+# DB의 datetime(서버 local time)을 HTTP date(GMT) 형식으로 변환.
+def http_date(dt: datetime) -> str:
+    return format_datetime(dt.astimezone(timezone.utc), usegmt=True)
+
+# If-None-Match가 있으면 ETag로, 없으면 If-Modified-Since로 304 응답 가능 여부를 판단. 
+def has_validators(headers) -> bool:
+    return "if-none-match" in headers or "if-modified-since" in headers
+
+def is_not_modified(headers, etag: str, last_modified: datetime = None) -> bool:
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since is not None and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        # "-0000" offset은 tzinfo 없는 datetime으로 반환되므로 UTC로 간주. 
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.astimezone(timezone.utc).replace(microsecond=0) <= since
+    return False
+
+# 작은 문자열 chunk들을 min_size 이상으로 모아서 전송. (send 호출 횟수를 줄임)
+async def buffer_chunks(chunks, min_size: int = 4096):
+    buffer = []
+    size = 0
+    async for chunk in chunks:
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= min_size:
+            yield "".join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield "".join(buffer)
+
+# Set-Cookie header 값 생성. (starlette Response.set_cookie()의 기본값과 동일) 
+# max_age=0 이면 cookie 삭제. 
+def cookie_header(key: str, value: str, max_age: int, httponly: bool = True) -> str:
+    cookie = f"{key}={value}; Max-Age={max_age}; Path=/; SameSite=lax"
+    if max_age == 0:
+        cookie += "; expires=Thu, 01 Jan 1970 00:00:00 GMT"
+    if httponly:
+        cookie += "; HttpOnly"
+    return cookie